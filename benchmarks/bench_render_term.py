@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Compare render_term throughput with the compiled lexicon against the
+previous implementation, which ran one query per [[link]].
+
+Run against a populated database:
+
+    python benchmarks/bench_render_term.py --links 30 --repeat 200
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bimdictionary.settings')
+
+import django  # noqa
+django.setup()
+
+from django.db.models import Q  # noqa
+
+from dictionary.lexicon import lexicon  # noqa
+from dictionary.models import TERM_PAT  # noqa
+from dictionary.models import Term  # noqa
+from dictionary.models import render_term  # noqa
+
+
+def legacy_sub_callback(group):
+    term_title = group.groups()[0]
+    terms = Term.objects.filter(
+        status=Term.PUBLISHED
+    ).filter(
+        Q(title__iexact=term_title) |
+        Q(pluraltitle__plural_title__iexact=term_title) |
+        Q(current_version__content__title__iexact=term_title)
+    )
+    if terms.exists():
+        return '<a class="term" tabindex="0" title="{0}">{0}</a>'.format(
+            term_title)
+    return term_title
+
+
+def legacy_render_term(text):
+    return re.sub(TERM_PAT, legacy_sub_callback, str(text))
+
+
+def sample_text(links):
+    titles = list(Term.objects.filter(
+        status=Term.PUBLISHED, title__isnull=False
+    ).values_list('title', flat=True)[:links]) or ['Building Information']
+    words = ['[[{}]] and some prose between links.'.format(
+        titles[i % len(titles)]) for i in range(links)]
+    return ' '.join(words)
+
+
+def measure(func, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(text)
+    elapsed = time.perf_counter() - start
+    return repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--links', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    text = sample_text(args.links)
+    lexicon.forms()
+
+    before = measure(legacy_render_term, text, args.repeat)
+    after = measure(render_term, text, args.repeat)
+    print('links per description: {}'.format(args.links))
+    print('query per link:   {:10.1f} renders/s'.format(before))
+    print('compiled lexicon: {:10.1f} renders/s'.format(after))
+    print('speedup:          {:10.1f}x'.format(after / before))
+
+
+if __name__ == '__main__':
+    main()
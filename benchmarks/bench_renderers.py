@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Compare encode time and payload size of DRF's JSONRenderer with the
+renderers in dictionary.api.v1.renderers on a serialized term list page.
+
+Run against a populated database, with orjson and msgpack installed:
+
+    python benchmarks/bench_renderers.py --page-size 200 --repeat 50
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bimdictionary.settings')
+
+import django  # noqa
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa
+
+from dictionary.api.v1 import renderers  # noqa
+from dictionary.api.v1.serializers import TermSerializer  # noqa
+from dictionary.documents import serializable_terms  # noqa
+from dictionary.models import Term  # noqa
+
+
+def page(page_size):
+    terms = serializable_terms().filter(
+        status=Term.PUBLISHED,
+        current_version__isnull=False
+    ).order_by('title')[:page_size]
+    return {
+        'count': page_size,
+        'next': None,
+        'previous': None,
+        'results': TermSerializer(terms, many=True).data,
+    }
+
+
+def measure(renderer, data, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        content = renderer.render(data)
+    return (time.perf_counter() - start) / repeat * 1000, content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--page-size', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    candidates = [('drf json', JSONRenderer())]
+    if renderers.orjson is not None:
+        candidates.append(('orjson', renderers.FastJSONRenderer()))
+    else:
+        print('orjson is not installed, skipping it')
+    if renderers.msgpack is not None:
+        candidates.append(('msgpack', renderers.MessagePackRenderer()))
+    else:
+        print('msgpack is not installed, skipping it')
+
+    data = page(args.page_size)
+    print('terms per page: {}'.format(len(data['results'])))
+    print('{:10} {:>10} {:>10} {:>10}'.format(
+        'renderer', 'encode ms', 'bytes', 'gzip'))
+    for name, renderer in candidates:
+        elapsed, content = measure(renderer, data, args.repeat)
+        print('{:10} {:10.2f} {:10} {:10}'.format(
+            name, elapsed, len(content), len(gzip.compress(content))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Compare building an uncached term list page by serializing every term
+with building it from the stored API documents.
+
+Run against a populated database whose documents have been built with
+manage.py update_api_documents:
+
+    python benchmarks/bench_term_list.py --page-size 200 --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bimdictionary.settings')
+
+import django  # noqa
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa
+
+from dictionary.api.v1.serializers import TermSerializer  # noqa
+from dictionary.documents import serializable_terms  # noqa
+from dictionary.models import Term  # noqa
+
+
+def serialized_page(page_size):
+    terms = serializable_terms().filter(
+        status=Term.PUBLISHED).order_by('title')[:page_size]
+    return JSONRenderer().render(TermSerializer(terms, many=True).data)
+
+
+def spliced_page(page_size):
+    documents = Term.objects.filter(
+        status=Term.PUBLISHED
+    ).order_by('title').values_list('api_document', flat=True)[:page_size]
+    return '[{}]'.format(','.join(documents)).encode()
+
+
+def measure(func, page_size, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(page_size)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--page-size', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if Term.objects.filter(
+            status=Term.PUBLISHED, api_document__isnull=True).exists():
+        sys.exit('Run manage.py update_api_documents first')
+
+    before = measure(serialized_page, args.page_size, args.repeat)
+    after = measure(spliced_page, args.page_size, args.repeat)
+    print('terms per page:   {}'.format(args.page_size))
+    print('serialized:       {:10.2f} ms'.format(before))
+    print('stored documents: {:10.2f} ms'.format(after))
+    print('speedup:          {:10.1f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
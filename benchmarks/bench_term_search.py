@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Compare the term list API's q search as one ranked query with the
+acronym, exact title and full-text cascade it replaced.
+
+Run against a populated database:
+
+    python benchmarks/bench_term_search.py --query bim --repeat 50 --explain
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bimdictionary.settings')
+
+import django  # noqa
+django.setup()
+
+from django.contrib.postgres.search import SearchQuery  # noqa
+from django.contrib.postgres.search import SearchRank  # noqa
+from django.db.models import F  # noqa
+
+from dictionary.api.v1.views import TermListView  # noqa
+from dictionary.models import Term  # noqa
+
+
+def published():
+    return Term.objects.filter(status=Term.PUBLISHED).order_by('title')
+
+
+def cascade(q, page_size):
+    qs = published()
+    acronym_matches = qs.filter(versions__content__acronym__iexact=q)
+    if acronym_matches.exists():
+        return list(acronym_matches[:page_size])
+    exact_matches = qs.filter(title__iexact=q)
+    if exact_matches.exists():
+        return list(exact_matches[:page_size])
+    query = SearchQuery(q)
+    return list(qs.filter(search_document=query).annotate(
+        rank=SearchRank(F('search_document'), query)
+    ).filter(rank__gte=0.1).order_by('rank').distinct()[:page_size])
+
+
+def ranked(q, page_size):
+    return list(TermListView().rank_terms(published(), q)[:page_size])
+
+
+def measure(func, q, page_size, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(q, page_size)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--query', action='append',
+                        help='Search text, may be repeated')
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--explain', action='store_true')
+    args = parser.parse_args()
+
+    for q in args.query or ['bim', 'building', 'information model']:
+        before = measure(cascade, q, args.page_size, args.repeat)
+        after = measure(ranked, q, args.page_size, args.repeat)
+        print('{!r:22} {:8.2f} ms -> {:8.2f} ms'.format(q, before, after))
+        if args.explain:
+            print(TermListView().rank_terms(
+                published(), q)[:args.page_size].explain(analyze=True))
+
+
+if __name__ == '__main__':
+    main()
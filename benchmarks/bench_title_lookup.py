@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Compare the trigram-indexed title lookups in dictionary.lookups with the
+ORM filters they replaced in the autocompletes, ManageView and the term
+list API's title= filter.
+
+Run against a populated database:
+
+    python benchmarks/bench_title_lookup.py --repeat 50 --explain
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bimdictionary.settings')
+
+import django  # noqa
+django.setup()
+
+from django.db.models import Q  # noqa
+
+from dictionary.lookups import CONTAINS  # noqa
+from dictionary.lookups import EXACT  # noqa
+from dictionary.lookups import search_terms  # noqa
+from dictionary.lookups import term_title_q  # noqa
+from dictionary.models import Term  # noqa
+from dictionary.models import TermVersion  # noqa
+
+
+def cases(q):
+    """(name, legacy queryset, new queryset) for the query q"""
+    return [
+        ('term autocomplete',
+         Term.objects.filter(title__istartswith=q[:4]),
+         search_terms(Term.objects.all(), q[:4])),
+        ('version autocomplete',
+         TermVersion.objects.filter(term__title__istartswith=q[:4]),
+         search_terms(TermVersion.objects.all(), q[:4], term='term__')),
+        ('manage search',
+         Term.objects.order_by('title').filter(title__icontains=q[1:5]),
+         search_terms(Term.objects.all(), q[1:5], CONTAINS)),
+        ('api title filter',
+         Term.objects.filter(
+             Q(versions__content__title__iexact=q) |
+             Q(versions__term__pluraltitle__plural_title__iexact=q)
+         ).distinct(),
+         Term.objects.filter(term_title_q(
+             q, EXACT, fuzzy=False, sources=['plurals', 'content'],
+             own=False)).distinct()),
+    ]
+
+
+def measure(qs, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        list(qs.all()[:20])
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--query', help='Title to look up')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--explain', action='store_true')
+    args = parser.parse_args()
+
+    q = args.query or Term.objects.exclude(
+        title__isnull=True
+    ).values_list('title', flat=True).first() or 'Building Information'
+    print('query: {!r}'.format(q))
+    for name, legacy, new in cases(q):
+        before = measure(legacy, args.repeat)
+        after = measure(new, args.repeat)
+        print('{:22} {:8.2f} ms -> {:8.2f} ms'.format(name, before, after))
+        if args.explain:
+            print(new.explain(analyze=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,28 @@
 import pytest
 
+from django.core.cache import cache
+
 from core.models import UserProfile
+from dictionary.lexicon import lexicon
+from dictionary.suggest import _suggest
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Cached pages, the compiled lexicon and suggestions outlive the test
+    # transaction
+    cache.clear()
+    lexicon.bump_version()
+    _suggest.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    # Snapshots are written to the default storage
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
 
 
 @pytest.fixture()
 def userprofile(db):
     return UserProfile.objects.create_user(
         email='test@test.com', password='test')
-
@@ -20,3 +20,20 @@ LANGUAGES = (
     ("tr", _('Türkçe')),
     ("zh", _("中文")),
 )
+
+# PostgreSQL text search configurations. Languages without a stemmer in
+# a stock PostgreSQL install fall back to 'simple'.
+SEARCH_CONFIGS = {
+    "de": "german",
+    "en": "english",
+    "es": "spanish",
+    "fr": "french",
+    "it": "italian",
+    "pt": "portuguese",
+    "ru": "russian",
+    "tr": "turkish",
+}
+
+
+def search_config(language):
+    return SEARCH_CONFIGS.get(language, "simple")
@@ -1,9 +1,15 @@
 from django import forms
 from django.contrib import admin
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
 
 from froala_editor.widgets import FroalaEditor
 from dal import autocomplete
 
+from core.languages import LANGUAGES
+from . import importers
 from . import models
 
 
@@ -74,6 +80,26 @@ class SynonymAdminForm(forms.ModelForm):
         fields = ['title', 'description', 'slug', 'canonical_term', 'language']
 
 
+class TranslationImportForm(forms.Form):
+    file = forms.FileField(
+        help_text='CSV, JSON, JSON Lines or XLIFF translation pack')
+    language = forms.ChoiceField(
+        choices=[('', '----------')] + list(LANGUAGES),
+        required=False,
+        help_text='Language for rows that do not specify one')
+    dry_run = forms.BooleanField(
+        initial=True,
+        required=False,
+        help_text='Report the changes without saving them')
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        try:
+            self.file_format = importers.guess_format(upload.name)
+        except importers.TranslationImportError as e:
+            raise forms.ValidationError(str(e))
+        return upload
+
 
 # Inlines
 
@@ -132,6 +158,46 @@ class TermContentAdmin(admin.ModelAdmin):
     list_filter = ['language', 'version__number', 'is_latest']
     form = TermContentAdminForm
 
+    def get_urls(self):
+        return [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_view),
+                name='dictionary_termcontent_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        result = None
+        form = TranslationImportForm(
+            request.POST or None, request.FILES or None)
+        if form.is_valid():
+            importer = importers.TranslationImporter(
+                dry_run=form.cleaned_data['dry_run'],
+                language=form.cleaned_data['language'] or None)
+            upload = form.cleaned_data['file']
+            try:
+                result = importer.run(
+                    importers.read_rows(upload.file, form.file_format))
+            except importers.TranslationImportError as e:
+                form.add_error('file', str(e))
+            else:
+                if not importer.dry_run:
+                    messages.info(request, 'Imported {}: {}'.format(
+                        upload.name, result))
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title='Import translations',
+            form=form,
+            result=result,
+        )
+        return TemplateResponse(
+            request, 'admin/dictionary/termcontent/import.html', context)
+
 
 @admin.register(models.Synonym)
 class SynonymAdmin(admin.ModelAdmin):
@@ -0,0 +1,124 @@
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from dictionary.cache import PAGE_TIMEOUT
+from dictionary.cache import get_generation
+
+
+class TermPagination(PageNumberPagination):
+    """
+    Page number pagination, or keyset pagination on (title, id) when the
+    request has a cursor parameter. Ranked searches are paged on (rank,
+    title, id), best first, so cursors keep the order of page numbers.
+    Cursor pages cost the same however deep they are and read the total
+    count from the cache. Pass an empty cursor to start from the beginning.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    count_timeout = PAGE_TIMEOUT
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.queryset = queryset
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+
+        ranked = 'rank' in queryset.query.annotations
+        if ranked:
+            qs = queryset.order_by('-rank', 'title', 'id')
+        else:
+            qs = queryset.order_by('title', 'id')
+        if position is not None:
+            if ranked != (len(position) == 3):
+                raise NotFound('Invalid cursor')
+            qs = qs.filter(self.after(*position))
+        results = list(qs[:page_size + 1])
+
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            last = results[-1]
+            self.next_position = [last.title, last.id]
+            if ranked:
+                self.next_position.append(last.rank)
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.get_count()),
+            ('next', self.get_next_cursor_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+    def after(self, title, pk, rank=None):
+        """
+        Rows after (title, pk) in title order, where NULL sorts last, or
+        after (rank, title, pk) with the highest rank first
+        """
+        if title is None:
+            q = Q(title__isnull=True, id__gt=pk)
+        else:
+            q = Q(title__gt=title) | Q(title=title, id__gt=pk) | \
+                Q(title__isnull=True)
+        if rank is None:
+            return q
+        return Q(rank__lt=rank) | Q(rank=rank) & q
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, value):
+        if not value:
+            return None
+        try:
+            position = json.loads(
+                base64.urlsafe_b64decode(value.encode('ascii')))
+            title, pk, *rank = position
+            if len(rank) > 1:
+                raise ValueError(position)
+            return (title, int(pk), *[float(x) for x in rank])
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position))
+
+    def get_count(self):
+        """Count the filtered terms once per set of filters"""
+        params = sorted(
+            (k, v) for k, v in self.request.query_params.items()
+            if k not in [
+                self.cursor_query_param, self.page_query_param,
+                self.page_size_query_param])
+        key = 'dictionary:term-count:{}:{}'.format(
+            get_generation(),
+            hashlib.md5(json.dumps(params).encode('utf-8')).hexdigest())
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(key, count, self.count_timeout)
+        return count
@@ -0,0 +1,58 @@
+"""
+Faster renderers for the dictionary API.
+
+FastJSONRenderer encodes with orjson when it is installed and produces the
+same JSON as DRF's JSONRenderer otherwise. MessagePackRenderer is offered
+for Accept: application/msgpack (or ?format=msgpack) when the msgpack
+package is installed. Both keep every view's schema as it is; values the
+encoders do not know natively go through DRF's JSON encoder.
+"""
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.renderers import JSONRenderer
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # orjson cannot indent by an arbitrary amount, leave that to DRF
+        if orjson is None or data is None or self.get_indent(
+                accepted_media_type, renderer_context or {}):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        content = orjson.dumps(
+            data, default=_encoder.default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME)
+        # Escaped by DRF so the output is also a valid javascript literal
+        return content.replace(
+            b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encoder.default, use_bin_type=True)
+
+
+API_RENDERERS = [FastJSONRenderer, BrowsableAPIRenderer]
+if msgpack is not None:
+    API_RENDERERS.append(MessagePackRenderer)
@@ -37,9 +37,15 @@ class TermContentSerializer(serializers.ModelSerializer):
     def get_author(self, obj):
         if obj.author and (obj.author.first_name or obj.author.last_name):
             return '{} {}'.format(
-                obj.author.first_name, obj.author.last_name).strip()
+                obj.author.first_name or '',
+                obj.author.last_name or '').strip()
 
     def get_similar(self, obj):
+        term = obj.version.term
+        if 'similar' in getattr(term, '_prefetched_objects_cache', {}):
+            return [
+                x.title for x in term.similar.all()
+                if x.language == obj.language]
         return obj.similar.values_list('title', flat=True)
 
 
@@ -51,6 +57,10 @@ class ConceptSerializer(serializers.ModelSerializer):
 
 
 class TermSerializer(serializers.ModelSerializer):
+    """
+    Pass a set of field names as the fields argument to serialize only
+    those, and content_fields to do the same for each content object.
+    """
 
     content = TermContentSerializer(source='latest_content', many=True)
     country = serializers.CharField()
@@ -70,8 +80,20 @@ class TermSerializer(serializers.ModelSerializer):
             'concepts',
         ]
 
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        content_fields = kwargs.pop('content_fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if content_fields is not None and 'content' in self.fields:
+            content = self.fields['content'].child
+            for name in set(content.fields) - set(content_fields):
+                content.fields.pop(name)
+
     def get_concepts(self, obj):
-        return obj.concepts.values_list('title', flat=-True)
+        return [x.title for x in obj.concepts.all()]
 
 
 class SimpleTermContentSerializer(serializers.ModelSerializer):
@@ -92,7 +114,7 @@ class SimpleTermContentSerializer(serializers.ModelSerializer):
         ]
 
     def get_concepts(self, obj):
-        return obj.version.term.concepts.values_list('title', flat=True)
+        return [x.title for x in obj.version.term.concepts.all()]
 
 
 class TermVersionSerializer(serializers.ModelSerializer):
@@ -119,8 +141,8 @@ class TermVersionSerializer(serializers.ModelSerializer):
         ]
 
     def get_concepts(self, obj):
-        return obj.term.concepts.values_list('title', flat=True)
+        return [x.title for x in obj.term.concepts.all()]
 
     def get_similar(self, obj):
-        return obj.term.similar.values_list('title', flat=True)
+        return [x.title for x in obj.term.similar.all()]
 
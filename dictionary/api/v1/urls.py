@@ -1,15 +1,35 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
 from dictionary.api.v1 import views
+from dictionary.api.v1.renderers import API_RENDERERS
+from dictionary.cache import conditional
+from dictionary.cache import stale_while_revalidate
 
 app_name = 'api'
 
 urlpatterns = [
-    path('simple/', views.SimpleTermContentListView.as_view()),
-    path('concepts/', views.ConceptListView.as_view()),
+    path(
+        'simple/',
+        conditional(views.content_modified, API_RENDERERS)(
+            stale_while_revalidate()(
+                views.SimpleTermContentListView.as_view()))),
+    path(
+        'concepts/',
+        conditional(views.concepts_modified, API_RENDERERS)(
+            views.ConceptListView.as_view())),
+    path('facets/', views.facets_view, name='facets'),
+    path('snapshot/', views.snapshot_view, name='snapshot'),
+    path(
+        'suggest/',
+        conditional(views.suggest_modified)(views.suggest_view),
+        name='suggest'),
+    path(
+        'export/<slug:export_format>/',
+        views.export_view,
+        name='export'),
     path(
         '',
-        cache_page(60 * 60 * 12)(views.TermListView.as_view()),
+        conditional(views.content_modified, API_RENDERERS)(
+            stale_while_revalidate()(views.TermListView.as_view())),
         name='term-list'),
 ]
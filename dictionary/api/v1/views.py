@@ -1,15 +1,55 @@
 from django.contrib.postgres.search import SearchQuery
 from django.contrib.postgres.search import SearchRank
-from django.contrib.postgres.search import SearchVector
+from django.db.models import Case
+from django.db.models import Exists
+from django.db.models import FloatField
+from django.db.models import Max
+from django.db.models import OuterRef
+from django.db.models import Prefetch
 from django.db.models import Q, F
+from django.db.models import Subquery
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.http import HttpResponse
+from django.http import JsonResponse
+from django.http import StreamingHttpResponse
 
 from rest_framework import generics
+from rest_framework.exceptions import ValidationError
 
+from core.languages import LANGUAGES
+from core.languages import search_config
 from dictionary import models
 from dictionary.api.v1 import serializers
+from dictionary.api.v1.pagination import TermPagination
+from dictionary.api.v1.renderers import API_RENDERERS
+from dictionary.documents import render_documents
+from dictionary.documents import serializable_terms
+from dictionary.exporters import EXPORTERS
+from dictionary.facets import get_facets
+from dictionary.snapshot import get_manifest
+from dictionary.suggest import SUGGEST_SIZE
+from dictionary.suggest import suggest
+from dictionary.lookups import EXACT
+from dictionary.lookups import term_title_q
+
+
+def concepts_modified(request):
+    return models.Concept.objects.aggregate(Max('modified'))['modified__max']
+
+
+def content_modified(request):
+    """Latest change to any content, narrowed to a language if given"""
+    qs = models.TermContent.objects.all()
+    if 'language' in request.GET:
+        qs = qs.filter(language=request.GET['language'])
+    return qs.aggregate(Max('modified'))['modified__max']
 
 
 class ConceptListView(generics.ListAPIView):
+    renderer_classes = API_RENDERERS
     serializer_class = serializers.ConceptSerializer
     permission_classes = []
     pagination_class = None
@@ -20,6 +60,7 @@ class ConceptListView(generics.ListAPIView):
 
 class SimpleTermContentListView(generics.ListAPIView):
 
+    renderer_classes = API_RENDERERS
     permission_classes = []
     serializer_class = serializers.SimpleTermContentSerializer
 
@@ -27,78 +68,290 @@ class SimpleTermContentListView(generics.ListAPIView):
         q = self.request.GET.get('q')
         language = self.request.GET.get('language', 'en')
 
-        qs = models.TermContent.objects.filter(
+        qs = models.TermContent.objects.select_related(
+            'version__term'
+        ).prefetch_related(
+            'version__term__concepts'
+        ).filter(
             is_latest=True, language=language)
 
         if q:
-            qs = qs.filter(description__search=q)
+            qs = qs.filter(
+                search_vector=SearchQuery(q, config=search_config(language)))
 
         return qs.distinct()
 
 
 class TermListView(generics.ListAPIView):
 
+    renderer_classes = API_RENDERERS
     permission_classes = []
     serializer_class = serializers.TermSerializer
+    pagination_class = TermPagination
+
+    # Scores for the kinds of q hits, each outranking the ones after it.
+    # Exact titles are prefixes too, full-text ranks add at most about 1
+    ACRONYM_SCORE = 8
+    EXACT_SCORE = 4
+    PREFIX_SCORE = 2
+    MIN_SEARCH_RANK = 0.1
+
+    # Columns each content field reads, besides the ones every row needs
+    CONTENT_COLUMNS = {
+        'code': ['placeholder'],
+        'title': ['title'],
+        'description': ['rendered_description'],
+        'extended_description': ['extended_description'],
+        'author': ['author'],
+        'acronym': ['acronym'],
+    }
+
+    def get_sparse_fields(self):
+        """
+        Parse ?fields=id,title,content.title into the term fields and the
+        content fields to serialize, None meaning all of them
+        """
+        if not hasattr(self, '_sparse_fields'):
+            fields = content_fields = None
+            value = self.request.GET.get('fields')
+            if value:
+                names = {x.strip() for x in value.split(',') if x.strip()}
+                content_fields = {
+                    x.split('.', 1)[1] for x in names
+                    if x.startswith('content.')}
+                fields = {x.split('.', 1)[0] for x in names}
+                if 'content' in names or not content_fields:
+                    content_fields = None
+                term_serializer = serializers.TermSerializer()
+                unknown = fields - set(term_serializer.fields) | (
+                    content_fields or set()) - set(
+                        term_serializer.fields['content'].child.fields)
+                if unknown:
+                    raise ValidationError({
+                        'fields': 'Unknown fields: {}'.format(
+                            ', '.join(sorted(unknown)))})
+            self._sparse_fields = fields, content_fields
+        return self._sparse_fields
+
+    def get_content_languages(self):
+        value = self.request.GET.get('content_language')
+        if value:
+            return [x.strip() for x in value.split(',') if x.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        fields, content_fields = self.get_sparse_fields()
+        kwargs.setdefault('fields', fields)
+        kwargs.setdefault('content_fields', content_fields)
+        return super().get_serializer(*args, **kwargs)
 
     def get_queryset(self):
+        fields, content_fields = self.get_sparse_fields()
+        languages = self.get_content_languages()
+        # The stored documents are only read by the JSON fast path in list()
+        qs = self.filter_terms().defer('api_document', 'search_document')
+        if fields is None and content_fields is None and not languages:
+            return qs
+
+        # Query only what the requested fields need
+        qs = qs.prefetch_related(None)
+        if fields is None or 'content' in fields:
+            columns = {'id', 'version', 'language', 'is_latest'}
+            for name in content_fields or self.CONTENT_COLUMNS:
+                columns.update(self.CONTENT_COLUMNS.get(name, []))
+            content = models.TermContent.objects.filter(
+                is_latest=True
+            ).only(*columns)
+            if languages:
+                content = content.filter(language__in=languages)
+            if content_fields is None or 'author' in content_fields:
+                content = content.select_related('author')
+            qs = qs.prefetch_related(
+                Prefetch(
+                    'versions',
+                    queryset=models.TermVersion.objects.only(
+                        'id', 'term', 'number')),
+                Prefetch('versions__content', queryset=content))
+            if content_fields is None or 'similar' in content_fields:
+                qs = qs.prefetch_related('similar')
+        if fields is None or 'concepts' in fields:
+            qs = qs.prefetch_related('concepts')
+        return qs
+
+    def filter_terms(self):
         q = self.request.GET.get('q')
         language = self.request.GET.get('language')
         country = self.request.GET.get('country')
         title = self.request.GET.get('title')
         concept = self.request.GET.get('concept')
 
-        # Current versions
-        qs = models.Term.objects.select_related(
-            'current_version'
-        ).prefetch_related(
-            'versions',
-            'versions__content',
-            'concepts'
-        ).filter(
-            status=models.Term.PUBLISHED,
-        ).order_by('title')
+        # Current versions. Terms without one have nothing to show and
+        # no stored document. Snapshots list the same terms in the same
+        # order, so clients can continue a page from either
+        qs = serializable_terms().listed()
 
+        # Filter on related rows with subqueries rather than joins, so
+        # terms are never duplicated and need no DISTINCT
         if language:
-            qs = qs.filter(
-                Q(versions__content__language=language)
-            )
+            qs = qs.filter(pk__in=models.TermContent.objects.filter(
+                language=language
+            ).values('version__term_id'))
 
         if title:
-            return qs.filter(
-                Q(versions__content__title__iexact=title) |
-                Q(versions__term__pluraltitle__plural_title__iexact=title)
-            ).distinct()
+            # Content and plural titles, as before the title indexes
+            return qs.filter(term_title_q(
+                title, EXACT, fuzzy=False, sources=['plurals', 'content'],
+                own=False))
 
         if country:
             qs = qs.filter(country__iexact=country)
 
         if concept:
-            qs = qs.filter(concepts__title__iexact=concept)
+            qs = qs.filter(pk__in=models.Term.concepts.through.objects.filter(
+                concept__title__iexact=concept
+            ).values('term_id'))
 
         if q:
-            # Check for acronym match
-            acronym_matches = qs.filter(versions__content__acronym__iexact=q)
-            if acronym_matches.exists():
-                return acronym_matches
-
-            # Check for exact match
-            exact_matches = qs.filter(title__iexact=q)
-            if exact_matches.exists():
-                return exact_matches
-
-            # Full text search
-            vector = SearchVector('title', weight='A') + \
-                SearchVector('similar__title', weight='B') + \
-                SearchVector('versions__content__description', weight='C')
+            return self.rank_terms(qs, q, language)
+
+        return qs
+
+    def rank_terms(self, qs, q, language=None):
+        """
+        Score acronym, exact title, title prefix and full-text hits in a
+        single query, best first. Full-text hits use the stored search
+        document, or the language's own search vector if language is
+        given.
+        """
+        latest = models.TermContent.objects.filter(is_latest=True)
+        if language:
+            latest = latest.filter(language=language)
+        content = latest.filter(version__term=OuterRef('pk'))
+
+        if language:
+            query = SearchQuery(q, config=search_config(language))
+            text_hits = latest.filter(
+                search_vector=query).values('version__term_id')
+            matches = content.filter(
+                search_vector=query
+            ).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank').values('rank')[:1]
+            search_rank = Coalesce(
+                Subquery(matches, output_field=FloatField()), 0.0)
+        else:
             query = SearchQuery(q)
-            qs = qs.annotate(
-                rank=SearchRank(vector, query)
-            ).filter(
-                rank__gte=0.1
-            ).order_by(
-                'rank'
-            )
+            text_hits = models.Term.objects.filter(
+                search_document=query).values('id')
+            search_rank = Case(
+                When(search_document=query,
+                     then=SearchRank(F('search_document'), query)),
+                default=0.0,
+                output_field=FloatField())
+
+        # Each kind of hit is found through its own index and only those
+        # terms are scored; the rank threshold applies on top
+        candidates = latest.filter(
+            acronym__ilike=q
+        ).values('version__term_id').order_by().union(
+            models.Term.objects.filter(
+                title__ilike_startswith=q).values('id').order_by(),
+            text_hits.order_by())
+
+        def score(condition, value):
+            return Case(
+                When(condition, then=Value(float(value))),
+                default=Value(0.0),
+                output_field=FloatField())
+
+        return qs.filter(pk__in=candidates).annotate(
+            acronym_match=Exists(content.filter(acronym__ilike=q)),
+            search_rank=search_rank,
+        ).annotate(
+            rank=score(Q(acronym_match=True), self.ACRONYM_SCORE) +
+            score(Q(title__ilike=q), self.EXACT_SCORE) +
+            score(Q(title__ilike_startswith=q), self.PREFIX_SCORE) +
+            F('search_rank')
+        ).filter(
+            Q(acronym_match=True) |
+            Q(title__ilike_startswith=q) |
+            Q(search_rank__gte=self.MIN_SEARCH_RANK)
+        ).order_by('-rank', 'title', 'id')
+
+    def list(self, request, *args, **kwargs):
+        # Stored documents hold every field in every language
+        if request.accepted_renderer.format != 'json' or \
+                any(self.get_sparse_fields()) or \
+                self.get_content_languages():
+            return super().list(request, *args, **kwargs)
+
+        # Splice the stored documents into the page, serializing only the
+        # terms whose document has not been built yet
+        queryset = self.filter_queryset(
+            self.filter_terms()
+        ).select_related(None).prefetch_related(None).only(
+            'id', 'title', 'api_document')
+        page = self.paginate_queryset(queryset)
+        documents = [(x.pk, x.api_document) for x in page]
+        missing = [pk for pk, document in documents if document is None]
+        if missing:
+            rendered = render_documents(
+                serializable_terms().filter(pk__in=missing))
+            documents = [
+                (pk, document or rendered[pk]) for pk, document in documents]
+
+        envelope = self.get_paginated_response([]).data
+        del envelope['results']
+        envelope = request.accepted_renderer.render(envelope)
+        results = ','.join(document for pk, document in documents)
+        return HttpResponse(
+            envelope[:-1] + ',"results":[{}]}}'.format(results).encode(),
+            content_type=request.accepted_renderer.media_type)
+
+
+def export_view(request, export_format):
+    """Stream the whole published dictionary"""
+    if export_format not in EXPORTERS:
+        raise Http404
+    exporter, content_type, extension = EXPORTERS[export_format]
+    response = StreamingHttpResponse(
+        exporter(), content_type='{}; charset=utf-8'.format(content_type))
+    response['Content-Disposition'] = \
+        'attachment; filename="bimdictionary.{}"'.format(extension)
+    return response
+
+
+def snapshot_view(request):
+    """Point at the latest full dictionary snapshot"""
+    manifest = get_manifest()
+    if manifest is None:
+        raise Http404
+    return JsonResponse(manifest)
+
+
+def facets_view(request):
+    """Published term counts by country, language and concept"""
+    return JsonResponse(get_facets())
+
+
+def suggest_modified(request):
+    """Suggestions have no timestamp of their own, only the generation"""
+    return None
 
-        return qs.distinct()
 
+def suggest_view(request):
+    """Titles and acronyms starting with q, for search as you type"""
+    language = request.GET.get('language', 'en')
+    if language not in dict(LANGUAGES):
+        return JsonResponse(
+            {'language': 'Unknown language: {}'.format(language)},
+            status=400)
+    try:
+        limit = int(request.GET.get('limit', SUGGEST_SIZE))
+    except ValueError:
+        limit = SUGGEST_SIZE
+    response = JsonResponse({'results': suggest(
+        language, request.GET.get('q', ''), limit)})
+    # Widgets repeat the same prefixes, browsers revalidate them against
+    # the generation ETag so unpublished terms drop out at once
+    response['Cache-Control'] = 'public, no-cache'
+    return response
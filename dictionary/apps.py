@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import pre_migrate
+
+
+def create_extensions(using, **kwargs):
+    """Trigram indexes need pg_trgm before the tables are created"""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
 
 
 class DictionaryConfig(AppConfig):
     name = 'dictionary'
 
+    def ready(self):
+        from . import lookups  # noqa
+        from . import signals  # noqa
+        pre_migrate.connect(create_extensions, sender=self)
@@ -0,0 +1,323 @@
+"""
+Generation-keyed page caching, conditional GET, stale-while-revalidate and
+template fragments.
+
+Every change to dictionary content bumps a shared generation counter, and
+cached pages are keyed on the generation they were rendered in. An edit
+therefore makes every cached page unreachable at once, so pages can be
+cached for days; stale generations simply age out of the cache.
+"""
+import datetime
+import hashlib
+import random
+import time
+from collections import Counter
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.utils.http import quote_etag
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.request import Request
+
+GENERATION_KEY = 'dictionary:generation'
+GENERATION_TIME_KEY = 'dictionary:generation-time'
+
+# Seven days
+PAGE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def initial_generation():
+    # Start from the clock rather than 1, so a generation lost with the
+    # cache is never reused by results kept outside it
+    return int(time.time() * 1000)
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, initial_generation(), None)
+        # Nothing says when the lost generation began, so assume now
+        cache.add(GENERATION_TIME_KEY, time.time(), None)
+        generation = cache.get(GENERATION_KEY) or initial_generation()
+    return generation
+
+
+def generation_modified():
+    """When the current generation began, as an aware datetime"""
+    timestamp = cache.get(GENERATION_TIME_KEY)
+    if timestamp is None:
+        get_generation()
+        timestamp = cache.get(GENERATION_TIME_KEY) or time.time()
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, initial_generation(), None)
+    cache.set(GENERATION_TIME_KEY, time.time(), None)
+
+
+def content_changed():
+    """
+    Bump the generation once the current transaction commits, so a page
+    rendered from uncommitted or rolled back data is never cached under
+    the new generation
+    """
+    transaction.on_commit(bump_generation)
+
+
+def generation_cache_page(timeout=PAGE_TIMEOUT, key_prefix='dictionary'):
+    """cache_page with the content generation folded into the key"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            prefix = '{}:{}'.format(key_prefix, get_generation())
+            cached_view = cache_page(timeout, key_prefix=prefix)(view)
+            return cached_view(request, *args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def conditional(latest_modified, renderer_classes=None, personal=False):
+    """
+    Answer conditional GETs before the view runs. latest_modified(request,
+    *args, **kwargs) returns the latest modified time of what the view
+    shows. Both validators also fold in the content generation, so changes
+    that leave no timestamp behind, such as deletions or edits to rows
+    without one, still change them. Pass the renderer_classes of a view
+    that negotiates its media type, so each representation gets an ETag
+    of its own. Pass personal=True for pages that show the user or their
+    messages, which the validators know nothing about: those requests are
+    always rendered.
+    """
+    def last_modified(request, *args, **kwargs):
+        # condition() asks for both validators, aggregate only once
+        if not hasattr(request, '_latest_modified'):
+            modified = latest_modified(request, *args, **kwargs)
+            request._latest_modified = max(
+                filter(None, [modified, generation_modified()]))
+        return request._latest_modified
+
+    def etag(request, *args, **kwargs):
+        modified = last_modified(request, *args, **kwargs)
+        # Kept so cached responses can carry the validators they had
+        request._etag = '{}-{}'.format(
+            get_generation(), int(modified.timestamp()) if modified else 0)
+        if renderer_classes:
+            request._etag += '-{}'.format(negotiated_format(
+                request, renderer_classes))
+        return request._etag
+
+    checked = condition(etag_func=etag, last_modified_func=last_modified)
+    if not personal:
+        return checked
+
+    def decorator(view):
+        conditional_view = checked(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if is_personal(request):
+                response = view(request, *args, **kwargs)
+            else:
+                response = conditional_view(request, *args, **kwargs)
+            patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapped
+    return decorator
+
+
+def is_personal(request):
+    """Whether a page for request shows a logged in user or messages"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return True
+    # Counting does not mark the messages as shown
+    return bool(len(get_messages(request)))
+
+
+def negotiated_format(request, renderer_classes):
+    """The format of the renderer DRF will pick for request"""
+    try:
+        renderer, media_type = DefaultContentNegotiation().select_renderer(
+            Request(request), [x() for x in renderer_classes])
+    except NotAcceptable:
+        return 'none'
+    return renderer.format
+
+
+# Stale-while-revalidate
+
+STATS = ['hit', 'miss', 'stale', 'bypass']
+
+CACHED_TYPES = ('application/json', 'application/msgpack')
+
+
+def increment(key, delta=1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+def record(stat):
+    increment('dictionary:swr-stats:{}'.format(stat))
+
+
+def cache_stats(reset=False):
+    keys = {x: 'dictionary:swr-stats:{}'.format(x) for x in STATS}
+    values = cache.get_many(keys.values())
+    stats = {x: values.get(key, 0) for x, key in keys.items()}
+    if reset:
+        cache.delete_many(keys.values())
+    return stats
+
+
+def stale_while_revalidate(timeout=PAGE_TIMEOUT, stale_timeout=PAGE_TIMEOUT,
+                           jitter=0.1, lock_timeout=30):
+    """
+    Cache successful JSON and MessagePack responses. An entry is fresh for
+    about timeout seconds in its generation; after that it is served stale
+    for up to stale_timeout more seconds while the one request that wins
+    the rebuild lock renders a replacement. On a cold miss other requests
+    render the page themselves rather than wait for that rebuild. Expiry
+    is spread by +/- jitter so entries written together do not all expire
+    together. Entries keep the validators set by conditional() when they
+    were rendered, so a stale entry is never sent with newer ones.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            digest = hashlib.md5('{} {}'.format(
+                request.get_full_path(), request.META.get('HTTP_ACCEPT', '')
+            ).encode('utf-8')).hexdigest()
+            key = 'dictionary:swr:{}'.format(digest)
+            lock = 'dictionary:swr-lock:{}'.format(digest)
+            generation = get_generation()
+
+            entry = cache.get(key)
+            if entry is not None:
+                if entry['generation'] == generation and \
+                        time.time() < entry['fresh_until']:
+                    record('hit')
+                    return cached_response(entry)
+                if not cache.add(lock, 1, lock_timeout):
+                    record('stale')
+                    return cached_response(entry)
+            elif not cache.add(lock, 1, lock_timeout):
+                # Someone else is rendering this page, render it too but
+                # leave the caching to them
+                record('bypass')
+                return view(request, *args, **kwargs)
+
+            record('miss')
+            try:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response = response.render()
+                if response.status_code == 200 and response.get(
+                        'Content-Type', '').startswith(CACHED_TYPES):
+                    spread = 1 + random.uniform(-jitter, jitter)
+                    cache.set(key, {
+                        'generation': generation,
+                        'fresh_until': time.time() + timeout * spread,
+                        'content': response.content,
+                        'headers': dict(
+                            cached_headers(response),
+                            **validators(request)),
+                    }, int((timeout + stale_timeout) * spread))
+            finally:
+                cache.delete(lock)
+            return response
+        return wrapped
+    return decorator
+
+
+def cached_headers(response):
+    return {
+        k: response[k] for k in ['Content-Type', 'Vary']
+        if response.has_header(k)}
+
+
+def validators(request):
+    """The ETag and Last-Modified conditional() worked out for request"""
+    headers = {}
+    if getattr(request, '_etag', None):
+        headers['ETag'] = quote_etag(request._etag)
+    if getattr(request, '_latest_modified', None):
+        headers['Last-Modified'] = http_date(
+            request._latest_modified.timestamp())
+    return headers
+
+
+def cached_response(entry):
+    # condition() leaves validators already on the response alone
+    response = HttpResponse(entry['content'])
+    for header, value in entry['headers'].items():
+        response[header] = value
+    return response
+
+
+# Template fragments, see the fragment tag in dictionary_tags
+
+FRAGMENTS = ['term-card', 'term-related', 'term-languages', 'term-versions']
+
+# Share of requests whose fragment hits and misses are counted
+FRAGMENT_SAMPLE_RATE = 0.1
+
+
+def fragment_key(name, parts):
+    digest = hashlib.md5(
+        ':'.join(str(x) for x in parts).encode('utf-8')).hexdigest()
+    return 'dictionary:fragment:{}:{}'.format(name, digest)
+
+
+def fragment_stat_key(name, stat):
+    return 'dictionary:fragment-stats:{}:{}'.format(name, stat)
+
+
+def record_fragment(request, name, stat):
+    """
+    Count a fragment hit or miss of request, if it is sampled. Counts are
+    kept on the request until flush_fragment_stats writes them.
+    """
+    if not hasattr(request, '_fragment_stats'):
+        sampled = random.random() < FRAGMENT_SAMPLE_RATE
+        request._fragment_stats = Counter() if sampled else None
+    if request._fragment_stats is not None:
+        request._fragment_stats[name, stat] += 1
+
+
+def flush_fragment_stats(request):
+    """Write the fragment counts of request once it is rendered"""
+    stats = getattr(request, '_fragment_stats', None)
+    for (name, stat), count in (stats or {}).items():
+        increment(fragment_stat_key(name, stat), count)
+    request._fragment_stats = None
+
+
+def fragment_stats(reset=False):
+    """Sampled hits and misses of each fragment"""
+    keys = {
+        (name, stat): fragment_stat_key(name, stat)
+        for name in FRAGMENTS for stat in ['hit', 'miss']}
+    values = cache.get_many(keys.values())
+    stats = {name: {'hit': 0, 'miss': 0} for name in FRAGMENTS}
+    for (name, stat), key in keys.items():
+        stats[name][stat] = values.get(key, 0)
+    if reset:
+        cache.delete_many(keys.values())
+    return stats
@@ -0,0 +1,101 @@
+"""
+Pre-serialized API documents.
+
+Term.api_document holds the JSON the term list API returns for a term, so
+list pages can be assembled from stored text instead of serializing every
+term on every request. Signals queue the terms an edit touches and their
+documents are rebuilt once the transaction commits. Rebuilding a term's
+document also stamps Term.modified, so the same queue keeps the term
+page's cached fragments current.
+"""
+import threading
+
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Prefetch
+
+BATCH_SIZE = 200
+
+_pending = threading.local()
+
+
+def serializable_terms():
+    """Terms with everything TermSerializer reads prefetched"""
+    from .models import Term
+    from .models import TermContent
+
+    return Term.objects.select_related(
+        'current_version'
+    ).prefetch_related(
+        Prefetch(
+            'versions__content',
+            queryset=TermContent.objects.filter(
+                is_latest=True
+            ).select_related('author')),
+        'similar',
+        'concepts'
+    )
+
+
+def render_documents(terms):
+    """Map term id to the JSON the API returns for it"""
+    from rest_framework.renderers import JSONRenderer
+    from .api.v1.serializers import TermSerializer
+
+    renderer = JSONRenderer()
+    return {
+        term.pk: renderer.render(TermSerializer(term).data).decode('utf-8')
+        for term in terms}
+
+
+def update_documents(term_ids, batch_size=BATCH_SIZE):
+    """
+    Rebuild api_document for term_ids and stamp their modified time, which
+    keys the term page's cached fragments, and mark the snapshot stale if
+    any of them is published. Returns the number of terms.
+    """
+    from .models import Term
+    from .snapshot import mark_snapshot_stale
+
+    term_ids = sorted(set(term_ids))
+    now = timezone.now()
+    published = False
+    for start in range(0, len(term_ids), batch_size):
+        terms = list(serializable_terms().filter(
+            pk__in=term_ids[start:start + batch_size]))
+        documents = render_documents(
+            x for x in terms if x.current_version_id)
+        for term in terms:
+            term.api_document = documents.get(term.pk)
+            term.modified = now
+        Term.objects.bulk_update(terms, ['api_document', 'modified'])
+        published |= any(x.status == Term.PUBLISHED for x in terms)
+    if published:
+        mark_snapshot_stale()
+    return len(term_ids)
+
+
+def queue_documents(term_ids):
+    """Rebuild the documents of term_ids once the transaction commits"""
+    term_ids = {x for x in term_ids if x}
+    if not term_ids:
+        return
+    if not hasattr(_pending, 'term_ids'):
+        _pending.term_ids = set()
+    _pending.term_ids.update(term_ids)
+    transaction.on_commit(flush_documents)
+
+
+def flush_documents():
+    from .references import flush_rerender
+    from .references import rerender_pending
+
+    # Re-rendering descriptions queues their terms too, so run it first
+    # and rebuild each document once
+    if rerender_pending():
+        flush_rerender()
+        return
+    term_ids = getattr(_pending, 'term_ids', None)
+    _pending.term_ids = set()
+    if term_ids:
+        update_documents(term_ids)
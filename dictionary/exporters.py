@@ -0,0 +1,172 @@
+"""
+Streaming exports of the published dictionary.
+
+Every exporter is a generator of text chunks built from keyset chunks of
+terms, so memory use does not depend on the size of the dictionary.
+"""
+import csv
+import json
+import re
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.db.models import Prefetch
+from django.urls import reverse
+
+from .models import TERM_PAT
+from .models import Term
+from .models import TermContent
+from .utils import chunked_queryset
+
+SKOS_CONTEXT = {
+    'skos': 'http://www.w3.org/2004/02/skos/core#',
+    'dct': 'http://purl.org/dc/terms/',
+}
+
+CSV_COLUMNS = [
+    'term_id', 'slug', 'term_title', 'country', 'concepts', 'language',
+    'version', 'code', 'title', 'acronym', 'description',
+    'extended_description', 'similar', 'plurals']
+
+
+def published_terms():
+    return Term.objects.filter(
+        status=Term.PUBLISHED
+    ).select_related(
+        'current_version'
+    ).prefetch_related(
+        Prefetch(
+            'versions__content',
+            queryset=TermContent.objects.filter(is_latest=True)),
+        'similar',
+        'concepts',
+        'pluraltitle_set',
+    )
+
+
+def site_url():
+    scheme = 'https' if settings.HTTPS else 'http'
+    return '{}://{}'.format(scheme, Site.objects.get_current().domain)
+
+
+def plain_text(text):
+    """Strip [[link]] markup from a description"""
+    return re.sub(TERM_PAT, r'\1', text or '')
+
+
+def term_record(term):
+    contents = sorted(term.latest_content, key=lambda x: x.language)
+    return {
+        'id': term.id,
+        'title': term.title,
+        'slug': term.slug,
+        'country': term.country.code or None,
+        'current_version': term.version_number,
+        'concepts': sorted(x.title for x in term.concepts.all()),
+        'content': [{
+            'language': content.language,
+            'version': content.version.number,
+            'code': content.code,
+            'title': content.title,
+            'acronym': content.acronym,
+            'description': content.description,
+            'extended_description': content.extended_description,
+            'similar': sorted(
+                x.title for x in term.similar.all()
+                if x.language == content.language),
+            'plurals': sorted(
+                x.plural_title for x in term.pluraltitle_set.all()
+                if x.language == content.language),
+        } for content in contents],
+    }
+
+
+def term_records(chunk_size=200):
+    for chunk in chunked_queryset(published_terms(), chunk_size):
+        for term in chunk:
+            yield term_record(term)
+
+
+class Echo:
+    """File-like object that hands back what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def export_ndjson(chunk_size=200):
+    for record in term_records(chunk_size):
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_csv(chunk_size=200):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in term_records(chunk_size):
+        for content in record['content']:
+            yield writer.writerow([
+                record['id'],
+                record['slug'],
+                record['title'],
+                record['country'] or '',
+                '; '.join(record['concepts']),
+                content['language'],
+                content['version'],
+                content['code'],
+                content['title'] or '',
+                content['acronym'] or '',
+                content['description'] or '',
+                content['extended_description'] or '',
+                '; '.join(content['similar']),
+                '; '.join(content['plurals']),
+            ])
+
+
+def skos_concept(record, base_url, scheme_id):
+    def labels(values, language):
+        return [{'@value': x, '@language': language} for x in values if x]
+
+    concept = {
+        '@id': base_url + reverse(
+            'term-detail-redirect-b', args=[record['slug']]),
+        '@type': 'skos:Concept',
+        'skos:inScheme': {'@id': scheme_id},
+        'skos:prefLabel': [],
+        'skos:altLabel': [],
+        'skos:hiddenLabel': [],
+        'skos:definition': [],
+        'skos:notation': [],
+        'dct:subject': record['concepts'],
+    }
+    for content in record['content']:
+        language = content['language']
+        concept['skos:prefLabel'] += labels([content['title']], language)
+        concept['skos:altLabel'] += labels(
+            [content['acronym']] + content['similar'], language)
+        concept['skos:hiddenLabel'] += labels(content['plurals'], language)
+        concept['skos:definition'] += labels(
+            [plain_text(content['description'])], language)
+        concept['skos:notation'].append(content['code'])
+    return {k: v for k, v in concept.items() if v}
+
+
+def export_jsonld(chunk_size=200):
+    base_url = site_url()
+    scheme_id = base_url + '/'
+    yield '{{"@context": {}, "@graph": [\n'.format(json.dumps(SKOS_CONTEXT))
+    yield json.dumps({
+        '@id': scheme_id,
+        '@type': 'skos:ConceptScheme',
+        'dct:title': 'BIM Dictionary',
+    })
+    for record in term_records(chunk_size):
+        yield ',\n' + json.dumps(
+            skos_concept(record, base_url, scheme_id), ensure_ascii=False)
+    yield '\n]}\n'
+
+
+EXPORTERS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (export_csv, 'text/csv', 'csv'),
+    'jsonld': (export_jsonld, 'application/ld+json', 'jsonld'),
+}
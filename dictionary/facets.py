@@ -0,0 +1,80 @@
+"""
+Counts of published terms by country, language and concept.
+
+Each facet is one GROUP BY query and the three are cached together under
+the content generation, so the filters on the index page cost a cache
+read however large the dictionary grows.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django_countries import countries
+
+from core.languages import LANGUAGES
+from .cache import PAGE_TIMEOUT
+from .cache import get_generation
+
+all_languages = dict(LANGUAGES)
+all_countries = dict(countries)
+
+
+def country_facet():
+    from .models import Term
+
+    rows = Term.objects.filter(
+        status=Term.PUBLISHED
+    ).exclude(
+        country__isnull=True
+    ).exclude(
+        country=''
+    ).annotate(
+        code=Upper('country')
+    ).values('code').annotate(count=Count('id')).order_by('code')
+    return [
+        {'code': x['code'], 'name': all_countries.get(x['code']),
+         'count': x['count']}
+        for x in rows]
+
+
+def language_facet():
+    from .models import Term
+    from .models import TermContent
+
+    rows = TermContent.objects.filter(
+        is_latest=True,
+        version__term__status=Term.PUBLISHED
+    ).values('language').annotate(
+        count=Count('version__term', distinct=True)
+    ).order_by('language')
+    return [
+        {'code': x['language'], 'name': str(all_languages.get(x['language'])),
+         'count': x['count']}
+        for x in rows]
+
+
+def concept_facet():
+    from .models import Concept
+    from .models import Term
+
+    rows = Concept.objects.annotate(
+        count=Count('term', filter=Q(term__status=Term.PUBLISHED))
+    ).order_by('title').values('id', 'title', 'count')
+    return list(rows)
+
+
+def compute_facets():
+    return {
+        'countries': country_facet(),
+        'languages': language_facet(),
+        'concepts': concept_facet(),
+    }
+
+
+def get_facets():
+    key = 'dictionary:facets:{}'.format(get_generation())
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets()
+        cache.set(key, facets, PAGE_TIMEOUT)
+    return facets
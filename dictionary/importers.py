@@ -0,0 +1,467 @@
+"""
+Bulk import of translation packs.
+
+Rows are plain dictionaries with the keys below. ``term`` is the term slug
+and ``version`` defaults to the term's current version. ``similar`` and
+``plurals`` are lists, or strings with one title per line; when a row omits
+them the existing synonyms and plurals are left alone.
+
+    term, version, language, title, acronym, description,
+    extended_description, similar, plurals
+"""
+import csv
+import io
+import json
+import os
+from itertools import islice
+from xml.etree import ElementTree
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from core.languages import LANGUAGES
+from .cache import content_changed
+from .documents import update_documents
+from .lexicon import lexicon
+from .models import PluralTitle
+from .models import RENDERED_FIELDS
+from .models import Synonym
+from .models import Term
+from .models import TermContent
+from .models import TermVersion
+from .models import render_fields
+from .references import rerender_references
+
+CONTENT_FIELDS = ['title', 'acronym', 'description', 'extended_description']
+
+all_languages = dict(LANGUAGES)
+
+
+class TranslationImportError(Exception):
+    pass
+
+
+# Readers
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield {k.strip(): v for k, v in row.items() if k}
+
+
+def read_json(stream):
+    """Read a JSON array or JSON Lines, one object at a time"""
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    if first == '[':
+        yield from read_json_array(stream)
+        return
+    if first:
+        yield json.loads(first + stream.readline())
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_json_array(stream, read_size=64 * 1024):
+    """
+    Yield the items of a JSON array whose opening bracket has been read,
+    holding no more than one item and one read in memory
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    separated = True
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer) or not separated and buffer[pos] not in ',]':
+            if eof:
+                raise ValueError('Unterminated JSON array')
+            data = stream.read(read_size)
+            eof = not data
+            buffer = buffer[pos:] + data
+            pos = 0
+            continue
+        if buffer[pos] == ']':
+            return
+        if buffer[pos] == ',' and not separated:
+            separated = True
+            pos += 1
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = len(buffer)
+        if end == len(buffer) and not eof:
+            # The item may go on in the next read
+            data = stream.read(read_size)
+            eof = not data
+            buffer = buffer[pos:] + data
+            pos = 0
+            continue
+        yield item
+        pos = end
+        separated = False
+
+
+def read_xliff(stream):
+    """
+    Read an XLIFF 1.2 file. Each trans-unit id is ``<slug>.<version>.<field>``
+    and the target language comes from the enclosing file element.
+    """
+    language = None
+    key = None
+    row = None
+    for event, element in ElementTree.iterparse(
+            stream, events=['start', 'end']):
+        tag = element.tag.rsplit('}', 1)[-1]
+        if event == 'start' and tag == 'file':
+            language = element.get('target-language', '').split('-')[0]
+        elif event == 'end' and tag == 'trans-unit':
+            unit_id = element.get('id') or ''
+            if unit_id.count('.') < 2:
+                raise ValueError('Invalid trans-unit id {!r}'.format(unit_id))
+            slug, version, field = unit_id.rsplit('.', 2)
+            target = next(
+                (x for x in element if x.tag.rsplit('}', 1)[-1] == 'target'),
+                None)
+            text = ''.join(target.itertext()) if target is not None else ''
+            if row is not None and key != (slug, version, language):
+                yield row
+                row = None
+            if row is None:
+                key = (slug, version, language)
+                row = {'term': slug, 'version': version, 'language': language}
+            row[field] = text
+            element.clear()
+    if row is not None:
+        yield row
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'xliff': read_xliff,
+}
+
+
+def guess_format(filename):
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    extension = {
+        'jsonl': 'json', 'ndjson': 'json', 'xlf': 'xliff', 'xml': 'xliff',
+    }.get(extension, extension)
+    if extension not in READERS:
+        raise TranslationImportError(
+            'Unknown import format: {}'.format(filename))
+    return extension
+
+
+def read_rows(fileobj, file_format):
+    """
+    Yield rows from a binary file object. A file that cannot be parsed
+    raises TranslationImportError.
+    """
+    if file_format == 'xliff':
+        rows = read_xliff(fileobj)
+    else:
+        rows = READERS[file_format](io.TextIOWrapper(
+            fileobj, encoding='utf-8-sig', newline=''))
+    try:
+        yield from rows
+    except (ValueError, csv.Error, ElementTree.ParseError) as e:
+        # JSON and encoding errors are ValueErrors
+        raise TranslationImportError(
+            'Could not read the file: {}'.format(e))
+
+
+def split_titles(value):
+    if isinstance(value, str):
+        value = value.splitlines()
+    return {x.strip() for x in value or [] if x and x.strip()}
+
+
+# Importer
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        self.changes = []
+
+    @property
+    def total(self):
+        return self.created + self.updated + self.unchanged
+
+    def __str__(self):
+        return '{} created, {} updated, {} unchanged, {} errors'.format(
+            self.created, self.updated, self.unchanged, len(self.errors))
+
+
+class TranslationImporter:
+    """
+    Import translation rows a chunk at a time with a fixed number of
+    queries per chunk. is_latest and rendered descriptions that link to
+    imported titles are recomputed once, after the last chunk.
+    """
+
+    def __init__(self, chunk_size=1000, dry_run=False, language=None):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.language = language
+
+    def run(self, rows):
+        self.result = ImportResult()
+        self.term_ids = set()
+        self.forms = set()
+        rows = enumerate(rows, 1)
+        with transaction.atomic():
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self.import_chunk(chunk)
+            if not self.dry_run:
+                self.finish()
+        return self.result
+
+    def import_chunk(self, chunk):
+        rows = self.clean_rows(chunk)
+        if not rows:
+            return
+
+        # Resolve term versions
+        slugs = {x['term'] for _, x in rows}
+        terms = {
+            x.slug: x for x in Term.objects.filter(
+                slug__in=slugs
+            ).select_related('current_version')}
+        versions = {
+            (x.term_id, x.number): x for x in TermVersion.objects.filter(
+                term__slug__in=slugs)}
+
+        resolved = []
+        for line, row in rows:
+            term = terms.get(row['term'])
+            if term is None:
+                self.error(line, 'Unknown term {}'.format(row['term']))
+                continue
+            number = row.get('version') or term.version_number
+            version = versions.get((term.id, int(number or 0)))
+            if version is None:
+                self.error(line, 'Unknown version {} of {}'.format(
+                    number, row['term']))
+                continue
+            resolved.append((line, row, term, version))
+
+        existing = {
+            (x.version_id, x.language): x
+            for x in TermContent.objects.filter(
+                version__in=[x[3] for x in resolved],
+                language__in={x[1]['language'] for x in resolved})}
+
+        forms = lexicon.forms()
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        imported = []
+        for line, row, term, version in resolved:
+            content = existing.get((version.id, row['language']))
+            code = '{}.{}.{}'.format(
+                term.slug, version.number, row['language'])
+            self.term_ids.add(term.id)
+            if content is None:
+                if not row.get('title') and not row.get('description'):
+                    self.error(
+                        line, 'Translation must have a title or description')
+                    continue
+                content = TermContent(
+                    version=version, language=row['language'])
+                for field in CONTENT_FIELDS:
+                    setattr(content, field, row.get(field) or None)
+                to_create.append(content)
+                self.result.created += 1
+                self.result.changes.append((code, 'created', None, None))
+            else:
+                changed = self.apply_changes(content, row, code)
+                if not changed:
+                    self.result.unchanged += 1
+                    imported.append((line, row, term, version))
+                    continue
+                if content.placeholder and {
+                        'description', 'extended_description'} & changed:
+                    content.placeholder = False
+                # Repeated rows for content created in this chunk
+                if content.pk is not None:
+                    content.modified = now
+                    to_update.append(content)
+                self.result.updated += 1
+            for field, value in render_fields(
+                    content.description, content.extended_description,
+                    forms=forms).items():
+                setattr(content, field, value)
+            self.forms.add(content.title)
+            existing[(version.id, row['language'])] = content
+            imported.append((line, row, term, version))
+
+        if not self.dry_run:
+            TermContent.objects.bulk_create(to_create)
+            TermContent.objects.bulk_update(
+                to_update,
+                CONTENT_FIELDS + RENDERED_FIELDS + ['placeholder', 'modified'])
+
+        self.import_titles(
+            Synonym, 'canonical_term_id', 'title', 'similar', imported)
+        self.import_titles(
+            PluralTitle, 'term_id', 'plural_title', 'plurals', imported)
+
+    def clean_rows(self, chunk):
+        rows = []
+        for line, row in chunk:
+            row = {k: v for k, v in row.items() if v is not None}
+            if self.language:
+                row.setdefault('language', self.language)
+            if not row.get('term'):
+                self.error(line, 'Missing term')
+                continue
+            if row.get('language') not in all_languages:
+                self.error(line, 'Unknown language {}'.format(
+                    row.get('language')))
+                continue
+            if row.get('version') and not str(row['version']).isdigit():
+                self.error(line, 'Invalid version {}'.format(row['version']))
+                continue
+            invalid = self.validate_row(row)
+            if invalid:
+                self.error(line, invalid)
+                continue
+            rows.append((line, row))
+        return rows
+
+    def validate_row(self, row):
+        """The first field value the database would reject, if any"""
+        values = [
+            (TermContent, x, row[x]) for x in CONTENT_FIELDS if row.get(x)]
+        values += [
+            (Synonym, 'title', x) for x in split_titles(row.get('similar'))]
+        values += [
+            (PluralTitle, 'plural_title', x)
+            for x in split_titles(row.get('plurals'))]
+        for model, name, value in values:
+            try:
+                model._meta.get_field(name).run_validators(value)
+            except ValidationError as e:
+                return 'Invalid {} {!r}: {}'.format(
+                    name, value, ' '.join(e.messages))
+        return None
+
+    def apply_changes(self, content, row, code):
+        changed = set()
+        for field in CONTENT_FIELDS:
+            if field not in row:
+                continue
+            value = row[field] or None
+            old = getattr(content, field)
+            if old != value:
+                self.result.changes.append((code, field, old, value))
+                setattr(content, field, value)
+                changed.add(field)
+        return changed
+
+    def import_titles(self, model, term_field, title_field, key, rows):
+        """Sync synonyms or plurals for the rows that list them"""
+        wanted = {}
+        for line, row, term, version in rows:
+            if key in row:
+                code = '{}.{}'.format(term.slug, row['language'])
+                wanted[(term.id, row['language'])] = (
+                    line, code, split_titles(row[key]))
+        if not wanted:
+            return
+
+        existing = {}
+        for obj in model.objects.filter(**{
+                term_field + '__in': {x[0] for x in wanted},
+                'language__in': {x[1] for x in wanted}}):
+            existing.setdefault(
+                (getattr(obj, term_field), obj.language), []).append(obj)
+
+        changes = []
+        to_delete = []
+        for (term_id, language), (line, code, titles) in wanted.items():
+            current = {
+                getattr(x, title_field): x
+                for x in existing.get((term_id, language), [])}
+            removed = set(current) - titles
+            added = titles - set(current)
+            if removed or added:
+                changes.append(
+                    (line, code, term_id, language, removed, added))
+                to_delete += [current[x].pk for x in removed]
+
+        # Synonym titles are unique, plurals are unique per language. Skip
+        # titles that are taken and report them instead
+        unique = ['title'] if model is Synonym else [title_field, 'language']
+        taken = set(model.objects.filter(**{
+            title_field + '__in': {
+                x for change in changes for x in change[5]},
+        }).exclude(pk__in=to_delete).values_list(*unique))
+
+        to_create = []
+        slug_length = Synonym._meta.get_field('slug').max_length
+        for line, code, term_id, language, removed, added in changes:
+            for title in sorted(added):
+                unique_key = (title,) if model is Synonym else (
+                    title, language)
+                if unique_key in taken:
+                    self.error(line, '{} {} is already taken'.format(
+                        model._meta.verbose_name.capitalize(), title))
+                    added = added - {title}
+                    continue
+                taken.add(unique_key)
+                obj = model(language=language, **{
+                    term_field: term_id, title_field: title})
+                if model is Synonym:
+                    obj.slug = slugify(title)[:slug_length]
+                to_create.append(obj)
+            if not removed and not added:
+                continue
+            self.result.changes.append(
+                (code, key, sorted(removed), sorted(added)))
+            self.forms.update(removed | added)
+
+        if not self.dry_run:
+            # Without the per-row delete signals, whose work finish() does
+            # once for the whole import. Nothing refers to these rows.
+            removed = model.objects.filter(pk__in=to_delete)
+            removed._raw_delete(removed.db)
+            model.objects.bulk_create(to_create)
+
+    def finish(self):
+        """Recompute derived state for everything the import touched"""
+        TermContent.objects.filter(
+            version__term_id__in=self.term_ids
+        ).update_latest()
+        TermContent.objects.filter(
+            version__term_id__in=self.term_ids
+        ).update_search_vector()
+        Term.objects.filter(
+            pk__in=self.term_ids
+        ).update_search_document()
+        lexicon.invalidate()
+        rerender_references(self.forms - {None})
+        update_documents(self.term_ids)
+        content_changed()
+
+    def error(self, line, message):
+        self.result.errors.append((line, message))
@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.db import transaction
+
+LEXICON_VERSION_KEY = 'dictionary:lexicon-version'
+
+
+def normalize_form(form):
+    """Normalise a surface form so lookups are case insensitive"""
+    return form.strip().lower()
+
+
+class TermLexicon:
+    """
+    The set of surface forms a [[link]] can resolve to.
+
+    A surface form is the title of a published term, one of its plural
+    titles or the title of any content object in its current version. The
+    set is compiled once per process and rebuilt when the shared version
+    key in the cache changes, so an edit saved in one process invalidates
+    the lexicon in all of them.
+    """
+
+    def __init__(self):
+        self._forms = None
+        self._version = None
+
+    def forms(self):
+        version = cache.get(LEXICON_VERSION_KEY)
+        if self._forms is None or version != self._version:
+            self._forms = self.build()
+            self._version = version
+        return self._forms
+
+    def build(self):
+        from dictionary.models import PluralTitle
+        from dictionary.models import Term
+        from dictionary.models import TermContent
+
+        titles = Term.objects.filter(
+            status=Term.PUBLISHED
+        ).values_list('title', flat=True)
+        plurals = PluralTitle.objects.filter(
+            term__status=Term.PUBLISHED
+        ).values_list('plural_title', flat=True)
+        content_titles = TermContent.objects.filter(
+            version__current_for_term__status=Term.PUBLISHED
+        ).values_list('title', flat=True)
+
+        forms = titles.union(plurals, content_titles)
+        return frozenset(normalize_form(x) for x in forms if x)
+
+    def __contains__(self, form):
+        return normalize_form(form) in self.forms()
+
+    def invalidate(self):
+        """
+        Drop the compiled lexicon in this process now, so the rest of the
+        transaction sees its own changes, and in every other process once
+        it commits, so none of them rebuilds from rows not yet committed
+        """
+        self._forms = None
+        transaction.on_commit(self.bump_version)
+
+    def bump_version(self):
+        self._forms = None
+        try:
+            cache.incr(LEXICON_VERSION_KEY)
+        except ValueError:
+            cache.set(LEXICON_VERSION_KEY, 1, None)
+
+
+lexicon = TermLexicon()
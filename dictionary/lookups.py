@@ -0,0 +1,96 @@
+"""
+Indexed, typo-tolerant title matching.
+
+Term, content, synonym and plural titles carry GIN trigram indexes
+(pg_trgm). Django's own case-insensitive lookups wrap the column in
+UPPER(), which no index on the column can serve, so the ILIKE lookups
+below are used instead, together with pg_trgm's similarity operator for
+misspelt queries.
+"""
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import models
+from django.db.models import Q
+
+EXACT = 'ilike'
+PREFIX = 'ilike_startswith'
+CONTAINS = 'ilike_contains'
+
+
+class ILike(models.Lookup):
+    lookup_name = EXACT
+    pattern = '{}'
+
+    def process_rhs(self, compiler, connection):
+        rhs, params = super().process_rhs(compiler, connection)
+        params = [
+            self.pattern.format(connection.ops.prep_for_like_query(x))
+            for x in params]
+        return rhs, params
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return '{} ILIKE {}'.format(lhs, rhs), lhs_params + rhs_params
+
+
+@models.CharField.register_lookup
+class ILikeExact(ILike):
+    pass
+
+
+@models.CharField.register_lookup
+class ILikeStartsWith(ILike):
+    lookup_name = PREFIX
+    pattern = '{}%'
+
+
+@models.CharField.register_lookup
+class ILikeContains(ILike):
+    lookup_name = CONTAINS
+    pattern = '%{}%'
+
+
+def title_q(field, q, lookup=PREFIX, fuzzy=True):
+    """Match field against q with an indexed lookup, or by similarity"""
+    condition = Q(**{'{}__{}'.format(field, lookup): q})
+    if fuzzy:
+        condition |= Q(**{field + '__trigram_similar': q})
+    return condition
+
+
+SOURCES = ('synonyms', 'plurals', 'content')
+
+
+def term_title_q(q, lookup=PREFIX, fuzzy=True, term='', sources=SOURCES,
+                 own=True):
+    """
+    Match terms whose own title, unless own is False, or the titles of any
+    of sources match q. term is the path from the queryset's model to
+    Term, e.g. 'term__' for TermVersion.
+    """
+    from .models import PluralTitle
+    from .models import Synonym
+    from .models import TermContent
+
+    related = {
+        'synonyms': (Synonym, 'title', 'canonical_term_id'),
+        'plurals': (PluralTitle, 'plural_title', 'term_id'),
+        'content': (TermContent, 'title', 'version__term_id'),
+    }
+    condition = title_q(term + 'title', q, lookup, fuzzy) if own else Q()
+    for source in sources:
+        model, field, term_id = related[source]
+        condition |= Q(**{term + 'pk__in': model.objects.filter(
+            title_q(field, q, lookup, fuzzy)
+        ).values(term_id)})
+    return condition
+
+
+def search_terms(qs, q, lookup=PREFIX, term=''):
+    """Filter qs to terms matching q, most similar titles first"""
+    field = term + 'title'
+    return qs.filter(
+        term_title_q(q, lookup, term=term)
+    ).annotate(
+        similarity=TrigramSimilarity(field, q)
+    ).order_by('-similarity', field)
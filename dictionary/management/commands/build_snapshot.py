@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from dictionary.snapshot import build_snapshot
+from dictionary.snapshot import snapshot_stale
+
+
+class Command(BaseCommand):
+    help = 'Write a content-hashed snapshot of the published dictionary'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-stale', action='store_true',
+            help='Only build if published terms changed since the last '
+                 'snapshot, for running from cron')
+
+    def handle(self, *args, **options):
+        if options['if_stale'] and not snapshot_stale():
+            self.stdout.write('Snapshot is current')
+            return
+        manifest = build_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            'Snapshot {} with {} terms at {}'.format(
+                manifest['hash'], manifest['terms'], manifest['url'])))
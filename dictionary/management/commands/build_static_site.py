@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from dictionary.static_site import SITE_DIR
+from dictionary.static_site import build_pages
+from dictionary.static_site import plan_build
+from dictionary.static_site import read_manifest
+from dictionary.static_site import remove_pages
+from dictionary.static_site import site_pages
+from dictionary.static_site import write_manifest
+
+# Set in each pool worker
+_worker_root = None
+
+
+def init_worker(root):
+    global _worker_root
+    _worker_root = root
+
+
+def build_chunk(urls):
+    return build_pages(urls, _worker_root)
+
+
+class Command(BaseCommand):
+    help = 'Render the public dictionary to static HTML in the file storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--root', default=SITE_DIR,
+            help='Directory in the storage to write the site to')
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Render every page, changed or not')
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        root = options['root']
+        pages = site_pages()
+        manifest = {} if options['full'] else read_manifest(root)
+        changed, removed = plan_build(pages, manifest)
+
+        size = max(1, options['chunk_size'])
+        chunks = [changed[i:i + size] for i in range(0, len(changed), size)]
+        processes = min(max(1, options['processes']), len(chunks))
+        if processes > 1:
+            # Forked workers must not share the parent's connections
+            connections.close_all()
+            with multiprocessing.Pool(
+                    processes, initializer=init_worker,
+                    initargs=(root,)) as pool:
+                results = pool.map(build_chunk, chunks)
+        else:
+            init_worker(root)
+            results = [build_chunk(x) for x in chunks]
+        failed = [url for chunk in results for url in chunk]
+
+        remove_pages(removed, root)
+        for url in failed:
+            # Left out, so the next build tries again
+            del pages[url]
+            self.stderr.write('Could not render {}'.format(url))
+        write_manifest(pages, root)
+        self.stdout.write(self.style.SUCCESS(
+            'Rendered {} of {} pages, removed {}'.format(
+                len(changed) - len(failed), len(pages) + len(failed),
+                len(removed))))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from dictionary.cache import cache_stats
+from dictionary.cache import fragment_stats
+from dictionary.cache import get_generation
+
+
+class Command(BaseCommand):
+    help = (
+        'Show hit, miss and stale counts for the API response cache and '
+        'the term page fragments, sampled')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Zero the counters')
+
+    def handle(self, *args, **options):
+        stats = cache_stats(reset=options['reset'])
+        total = sum(stats.values())
+        self.stdout.write('generation: {}'.format(get_generation()))
+        for name, value in stats.items():
+            self.stdout.write('{:10} {:10} {:6.1%}'.format(
+                name, value, value / total if total else 0))
+
+        self.stdout.write('fragments:')
+        for name, value in fragment_stats(reset=options['reset']).items():
+            total = value['hit'] + value['miss']
+            self.stdout.write('{:16} {:10} hits {:10} misses {:6.1%}'.format(
+                name, value['hit'], value['miss'],
+                value['hit'] / total if total else 0))
@@ -0,0 +1,37 @@
+import gzip
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dictionary.exporters import EXPORTERS
+
+
+class Command(BaseCommand):
+    help = 'Write a gzipped export of the published dictionary to storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', dest='export_format', choices=sorted(EXPORTERS),
+            default='ndjson')
+        parser.add_argument(
+            '--name',
+            help='Storage path, defaults to exports/bimdictionary-<date>')
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        exporter, content_type, extension = EXPORTERS[options['export_format']]
+        name = options['name'] or 'exports/bimdictionary-{}.{}.gz'.format(
+            timezone.now().strftime('%Y%m%d%H%M%S'), extension)
+
+        with tempfile.TemporaryFile() as tmp:
+            with gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+                for chunk in exporter(chunk_size=options['chunk_size']):
+                    gz.write(chunk.encode('utf-8'))
+            tmp.seek(0)
+            name = default_storage.save(name, File(tmp))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Exported to {}'.format(default_storage.url(name))))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from dictionary.importers import READERS
+from dictionary.importers import TranslationImportError
+from dictionary.importers import TranslationImporter
+from dictionary.importers import guess_format
+from dictionary.importers import read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import a translation pack from CSV, JSON or XLIFF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', dest='file_format', choices=sorted(READERS),
+            help='Defaults to the file extension')
+        parser.add_argument(
+            '--language',
+            help='Language for rows that do not specify one')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report the changes without saving them')
+
+    def handle(self, *args, **options):
+        try:
+            file_format = options['file_format'] or \
+                guess_format(options['path'])
+        except TranslationImportError as e:
+            raise CommandError(e)
+
+        importer = TranslationImporter(
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            language=options['language'])
+        with open(options['path'], 'rb') as f:
+            try:
+                result = importer.run(read_rows(f, file_format))
+            except TranslationImportError as e:
+                raise CommandError(e)
+
+        verbosity = options['verbosity']
+        if options['dry_run'] or verbosity > 1:
+            for code, field, old, new in result.changes:
+                if field == 'created':
+                    self.stdout.write('+ {}'.format(code))
+                else:
+                    self.stdout.write('~ {} {}: {!r} -> {!r}'.format(
+                        code, field, old, new))
+        for line, message in result.errors:
+            self.stderr.write('Row {}: {}'.format(line, message))
+        self.stdout.write(self.style.SUCCESS('{}{}'.format(
+            'Dry run: ' if options['dry_run'] else '', result)))
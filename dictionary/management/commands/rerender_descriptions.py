@@ -0,0 +1,182 @@
+import datetime
+import json
+import multiprocessing
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_datetime
+
+from dictionary.cache import content_changed
+from dictionary.documents import update_documents
+from dictionary.lexicon import lexicon
+from dictionary.models import RENDERED_FIELDS
+from dictionary.models import TermContent
+from dictionary.models import render_fields
+from dictionary.rendering import RENDER_VERSION
+from dictionary.utils import chunked_queryset
+
+# Set in each pool worker so the lexicon is pickled once per process
+_worker_forms = None
+
+
+def init_worker(forms):
+    global _worker_forms
+    _worker_forms = forms
+
+
+def render_chunk(rows):
+    """
+    Render (pk, description, extended_description) rows without touching
+    the database
+    """
+    return [
+        (pk, render_fields(description, extended, forms=_worker_forms))
+        for pk, description, extended in rows]
+
+
+class Command(BaseCommand):
+    help = 'Recompute the rendered descriptions of term content'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--language', action='append', dest='languages',
+            help='Only re-render this language (can be repeated)')
+        parser.add_argument(
+            '--term', help='Only re-render the term with this slug')
+        parser.add_argument(
+            '--modified-since',
+            help='Only re-render content modified since this date or time')
+        parser.add_argument(
+            '--outdated', action='store_true',
+            help='Only re-render content rendered by an older renderer')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            '--checkpoint', default='.rerender_descriptions.json',
+            help='File recording progress so a run can be resumed')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Continue from the last checkpoint')
+
+    def handle(self, *args, **options):
+        filters = {
+            'languages': sorted(options['languages'] or []),
+            'term': options['term'],
+            'modified_since': options['modified_since'],
+        }
+        if options['outdated']:
+            # Only when set, so earlier checkpoints still match
+            filters['outdated'] = True
+        checkpoint = options['checkpoint']
+        start_after = None
+        updated = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                state = json.load(f)
+            if state['filters'] != filters:
+                raise CommandError(
+                    'Checkpoint {} was written with different filters: '
+                    '{}'.format(checkpoint, state['filters']))
+            start_after = state['last_pk']
+            updated = state['updated']
+            self.stdout.write('Resuming after id {}'.format(start_after))
+
+        queryset = self.get_queryset(filters).only(
+            'pk', 'description', 'extended_description', *RENDERED_FIELDS)
+        chunks = chunked_queryset(
+            queryset, options['chunk_size'], start_after=start_after)
+
+        forms = lexicon.forms()
+        processes = max(1, options['processes'])
+        pool = None
+        if processes > 1:
+            # Forked workers must not share the parent's connections
+            connections.close_all()
+            pool = multiprocessing.Pool(
+                processes, initializer=init_worker, initargs=(forms,))
+        else:
+            init_worker(forms)
+
+        try:
+            while True:
+                window = list(islice(chunks, processes))
+                if not window:
+                    break
+                payloads = [
+                    [(x.pk, x.description, x.extended_description)
+                     for x in chunk]
+                    for chunk in window]
+                if pool:
+                    results = pool.map(render_chunk, payloads)
+                else:
+                    results = [render_chunk(x) for x in payloads]
+                for chunk, rendered in zip(window, results):
+                    updated += self.write_chunk(chunk, rendered)
+                last_pk = window[-1][-1].pk
+                self.save_checkpoint(checkpoint, filters, last_pk, updated)
+                self.stdout.write('Processed up to id {} ({} updated)'.format(
+                    last_pk, updated))
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        if updated:
+            content_changed()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            'Re-rendered {} descriptions'.format(updated)))
+
+    def get_queryset(self, filters):
+        queryset = TermContent.objects.all()
+        if filters['languages']:
+            queryset = queryset.filter(language__in=filters['languages'])
+        if filters['term']:
+            queryset = queryset.filter(version__term__slug=filters['term'])
+        if filters['modified_since']:
+            since = parse_datetime(filters['modified_since'])
+            if since is None:
+                date = parse_date(filters['modified_since'])
+                if date is None:
+                    raise CommandError(
+                        'Invalid --modified-since: {}'.format(
+                            filters['modified_since']))
+                since = datetime.datetime(date.year, date.month, date.day)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            queryset = queryset.filter(modified__gte=since)
+        if filters.get('outdated'):
+            queryset = queryset.filter(render_version__lt=RENDER_VERSION)
+        return queryset
+
+    def write_chunk(self, chunk, rendered):
+        """Write back the rows whose output changed"""
+        changed = []
+        for content, (pk, fields) in zip(chunk, rendered):
+            if any(getattr(content, x) != y for x, y in fields.items()):
+                for field, value in fields.items():
+                    setattr(content, field, value)
+                changed.append(content)
+        TermContent.objects.bulk_update(changed, RENDERED_FIELDS)
+        if changed:
+            update_documents(TermContent.objects.filter(
+                pk__in=[x.pk for x in changed]
+            ).values_list('version__term_id', flat=True))
+        return len(changed)
+
+    def save_checkpoint(self, path, filters, last_pk, updated):
+        tmp_path = '{}.tmp'.format(path)
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'filters': filters,
+                'last_pk': last_pk,
+                'updated': updated,
+            }, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from dictionary.documents import update_documents
+from dictionary.models import Term
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the pre-serialized API document of every term'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        count = update_documents(
+            Term.objects.values_list('pk', flat=True),
+            batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Updated {} API documents'.format(count)))
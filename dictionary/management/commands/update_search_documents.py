@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from dictionary.models import Term
+from dictionary.models import TermContent
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the stored full-text search documents of every term '
+            'and the per-language search vectors of its content')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ids = list(Term.objects.order_by('pk').values_list('pk', flat=True))
+        size = options['chunk_size']
+        for start in range(0, len(ids), size):
+            chunk = ids[start:start + size]
+            TermContent.objects.filter(
+                version__term_id__in=chunk
+            ).update_search_vector()
+            Term.objects.filter(pk__in=chunk).update_search_document()
+        self.stdout.write(self.style.SUCCESS(
+            'Updated {} search documents'.format(len(ids))))
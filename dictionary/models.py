@@ -3,11 +3,26 @@ from collections import OrderedDict
 import functools
 
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.sites.models import Site
 from django.core.mail import send_mail
 from django.urls import reverse
 from django.db import models
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import Count
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import OuterRef
 from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models import Value
+from django.db.models import When
 from django.utils.text import slugify
 from django.utils.translation import ugettext_lazy as _
 
@@ -15,7 +30,13 @@ from django_countries.fields import CountryField
 
 from core.fields import LanguageField
 from core.languages import LANGUAGES
+from core.languages import SEARCH_CONFIGS
+from core.languages import search_config
 from core.models import UserProfile
+from .lexicon import lexicon
+from .lexicon import normalize_form
+from .rendering import RENDER_VERSION
+from .rendering import markdown_html
 
 TERM_PAT = '\[\[(.[^\]\]]*)\]\]'
 RTL_LANGUAGES = ['ar', 'fa']
@@ -30,7 +51,69 @@ class Concept(models.Model):
         return self.title
 
 
-class Term(models.Model):
+class TrackedFieldsMixin:
+    """
+    Remember the stored values of TRACKED_FIELDS in _loaded, when loaded
+    and after each save, so saves and their signals can tell what changed
+    without querying for it
+    """
+    TRACKED_FIELDS = []
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = {
+            x: instance.__dict__[x] for x in cls.TRACKED_FIELDS
+            if x in instance.__dict__}
+        return instance
+
+    def remember_loaded(self):
+        self._loaded = {x: getattr(self, x) for x in self.TRACKED_FIELDS}
+
+
+class TermQuerySet(models.QuerySet):
+
+    def listed(self):
+        """
+        Published terms with a current version, in the order the term list
+        API and snapshots both return them
+        """
+        return self.filter(
+            status=Term.PUBLISHED,
+            current_version__isnull=False
+        ).order_by('title', 'id')
+
+    def update_search_document(self):
+        """
+        Rebuild the stored search document from the title (weight A),
+        synonyms (B) and latest descriptions (C) in a single UPDATE
+        """
+        synonyms = Synonym.objects.filter(
+            canonical_term=OuterRef('pk')
+        ).values(
+            'canonical_term'
+        ).annotate(
+            text=StringAgg('title', ' ')
+        ).values('text')
+        descriptions = TermContent.objects.filter(
+            version__term=OuterRef('pk'),
+            is_latest=True
+        ).values(
+            'version__term'
+        ).annotate(
+            text=StringAgg('description', ' ')
+        ).values('text')
+        return self.update(search_document=(
+            SearchVector('title', weight='A') +
+            SearchVector(
+                Subquery(synonyms, output_field=models.TextField()),
+                weight='B') +
+            SearchVector(
+                Subquery(descriptions, output_field=models.TextField()),
+                weight='C')))
+
+
+class Term(TrackedFieldsMixin, models.Model):
     """
     Represents a dictionary term
     """
@@ -63,13 +146,37 @@ class Term(models.Model):
         related_name='current_for_term',
         null=True,
         on_delete=models.SET_NULL)
+    search_document = SearchVectorField(null=True, editable=False)
+    api_document = models.TextField(
+        null=True,
+        editable=False,
+        help_text=_('The term as the list API serializes it'))
+    modified = models.DateTimeField(
+        'Date Modified',
+        auto_now=True,
+        help_text=_('Last change to the term or anything shown with it'))
+
+    objects = TermQuerySet.as_manager()
+
+    # Read by the post_save signals
+    TRACKED_FIELDS = ['title', 'status', 'current_version_id']
 
     class Meta:
         app_label = 'dictionary'
+        indexes = [
+            GinIndex(fields=['search_document']),
+            GinIndex(
+                fields=['title'], opclasses=['gin_trgm_ops'],
+                name='dictionary_term_title_trgm'),
+            # Keyset pagination of the term list
+            models.Index(
+                fields=['title', 'id'], name='dictionary_term_title_id'),
+        ]
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.title)
         super().save(*args, **kwargs)
+        self.remember_loaded()
 
     def __str__(self):
         return self.title or self.slug
@@ -126,7 +233,6 @@ http://{}{}
         )
 
     @property
-    @functools.lru_cache(32)
     def latest_versions(self):
         """Return a dictionary mapping languages to latest version numbers"""
         language_max = TermContent.objects.filter(
@@ -141,7 +247,16 @@ http://{}{}
     @property
     def latest_content(self):
         """Return a list of the latest content objects for this term"""
-        return TermContent.objects.filter(version__term=self, is_latest=True)
+        versions = getattr(self, '_prefetched_objects_cache', {}).get(
+            'versions')
+        if versions is not None and all(
+                'content' in getattr(x, '_prefetched_objects_cache', {})
+                for x in versions):
+            return [
+                x for version in versions
+                for x in version.content.all() if x.is_latest]
+        return list(TermContent.objects.filter(
+            version__term=self, is_latest=True))
 
     def set_current(self, termversion):
         self.current_version = termversion
@@ -217,7 +332,40 @@ class TermVersion(models.Model):
         return self.content.filter(language='en').first()
 
 
-class TermContent(models.Model):
+class TermContentQuerySet(models.QuerySet):
+
+    def update_latest(self):
+        """
+        Recompute is_latest for every row in a single UPDATE: a row is the
+        latest when no content in the same language exists for a higher
+        version of its term.
+        """
+        newer = TermContent.objects.filter(
+            language=OuterRef('language'),
+            version__term__versions=OuterRef('version_id'),
+            version__number__gt=F('version__term__versions__number'))
+        return self.update(is_latest=~Exists(newer))
+
+    def update_search_vector(self):
+        """
+        Rebuild search_vector for every row in a single UPDATE, picking the
+        text search configuration from each row's language
+        """
+        config = Case(
+            *[When(language=language, then=Value(name))
+              for language, name in SEARCH_CONFIGS.items()],
+            default=Value(search_config(None)),
+            output_field=models.CharField())
+        return self.update(search_vector=content_search_vector(
+            'title', 'acronym', 'description', config))
+
+
+def content_search_vector(title, acronym, description, config):
+    return SearchVector(title, acronym, config=config, weight='A') + \
+        SearchVector(description, config=config, weight='B')
+
+
+class TermContent(TrackedFieldsMixin, models.Model):
     """
     The content of a term in a particular language
     """
@@ -238,37 +386,99 @@ class TermContent(models.Model):
     placeholder = models.BooleanField(default=False)
     acronym = models.CharField(max_length=20, null=True, blank=True)
     is_latest = models.BooleanField(default=False)
+    references = ArrayField(
+        models.CharField(max_length=255),
+        default=list,
+        blank=True,
+        help_text=_('Normalised surface forms of the [[links]] in the '
+                    'description'))
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Final HTML for the detail page, see dictionary.rendering
+    description_html = models.TextField(blank=True, editable=False)
+    extended_description_html = models.TextField(blank=True, editable=False)
+    render_version = models.PositiveSmallIntegerField(
+        default=0, editable=False)
+
+    objects = TermContentQuerySet.as_manager()
+
+    TRACKED_FIELDS = [
+        'version_id', 'title', 'description', 'extended_description',
+        'is_latest']
 
     class Meta:
         unique_together = ['version', 'language']
         verbose_name_plural = 'Term content'
+        indexes = [
+            GinIndex(fields=['references']),
+            GinIndex(
+                fields=['title'], opclasses=['gin_trgm_ops'],
+                name='dictionary_content_title_trgm'),
+            GinIndex(
+                fields=['acronym'], opclasses=['gin_trgm_ops'],
+                name='dictionary_acronym_trgm'),
+            # Latest modified time for conditional GETs
+            models.Index(fields=['modified']),
+        ] + [
+            # One small index per language, matched by language filters
+            GinIndex(
+                fields=['search_vector'],
+                condition=Q(language=language),
+                name='dictionary_search_{}'.format(language))
+            for language, name in LANGUAGES]
 
     def save(self, *args, **kwargs):
-        existing = TermContent.objects.filter(id=self.id).first()
-        if existing and self.placeholder:
-            changed = existing.description != self.description or \
-                existing.extended_description == self.description
+        loaded = getattr(self, '_loaded', {})
+        if self.pk and self.placeholder:
+            if not {'description', 'extended_description'} <= set(loaded):
+                loaded = TermContent.objects.filter(pk=self.pk).values(
+                    *self.TRACKED_FIELDS).first() or {}
+            changed = loaded.get('description') != self.description or \
+                loaded.get('extended_description') != \
+                self.extended_description
             if changed:
                 self.placeholder = False
 
-        # Populate is_latest
-        latest_version = self.version.term.latest_versions.get(self.language)
-        self.is_latest = latest_version == self.version.number
-
-        # Set is_latest on other term content objects to false
-        TermContent.objects.filter(
-            version__term=self.version.term,
+        # Populate the rendered descriptions and the links they depend on
+        for field, value in render_fields(
+                self.description, self.extended_description).items():
+            setattr(self, field, value)
+        self.search_vector = content_search_vector(*[
+            Value(getattr(self, x), output_field=models.TextField())
+            for x in ['title', 'acronym', 'description']
+        ], config=search_config(self.language))
+
+        siblings = TermContent.objects.filter(
+            version__term_id=self.version.term_id,
             language=self.language
         ).exclude(
-            id=self.id
-        ).update(
-            is_latest=False
+            pk=self.pk
         )
-
-        # Populate rendered_description
-        self.rendered_description = render_term(self.description)
-
-        super().save(*args, **kwargs)
+        with transaction.atomic(savepoint=False):
+            # Populate is_latest from the other versions in this language
+            stats = siblings.aggregate(
+                max_number=Max('version__number'),
+                latest=Count('pk', filter=Q(is_latest=True)))
+            self.is_latest = stats['max_number'] is None or \
+                stats['max_number'] < self.version.number
+
+            super().save(*args, **kwargs)
+
+            # Hand the flag over from the previous latest content. siblings
+            # was built before a new row had a pk, so exclude it again
+            if self.is_latest and stats['latest']:
+                siblings.filter(
+                    is_latest=True
+                ).exclude(pk=self.pk).update(is_latest=False)
+
+            # Latest descriptions feed the term's search document
+            latest_changed = self.is_latest != loaded.get('is_latest') or \
+                self.description != loaded.get('description')
+            if latest_changed and (self.is_latest or loaded.get('is_latest')):
+                Term.objects.filter(
+                    pk=self.version.term_id
+                ).update_search_document()
+
+        self.remember_loaded()
 
     def __str__(self):
         return self.title
@@ -336,7 +546,7 @@ class TermContent(models.Model):
         return '{}://{}{}'.format(scheme, domain, path)
 
 
-class PluralTitle(models.Model):
+class PluralTitle(TrackedFieldsMixin, models.Model):
     """
     A plural for a term, can be language specific
     """
@@ -346,6 +556,18 @@ class PluralTitle(models.Model):
 
     class Meta:
         unique_together = ['plural_title', 'language']
+        indexes = [
+            GinIndex(
+                fields=['plural_title'], opclasses=['gin_trgm_ops'],
+                name='dictionary_plural_title_trgm'),
+        ]
+
+    # Read by the post_save signals
+    TRACKED_FIELDS = ['plural_title']
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.remember_loaded()
 
     def __str__(self):
         return self.plural_title
@@ -364,33 +586,68 @@ class Synonym(models.Model):
         'Term', related_name='similar', on_delete=models.CASCADE)
     language = LanguageField(default='en')
 
+    class Meta:
+        indexes = [
+            GinIndex(
+                fields=['title'], opclasses=['gin_trgm_ops'],
+                name='dictionary_synonym_title_trgm'),
+        ]
+
     def __str__(self):
         return self.title
 
 
-def sub_callback(group):
+def sub_callback(group, forms=None):
+    if forms is None:
+        forms = lexicon.forms()
     term_title = group.groups()[0]
-    terms = Term.objects.filter(
-        status=Term.PUBLISHED
-    ).filter(
-        Q(title__iexact=term_title) |
-        Q(pluraltitle__plural_title__iexact=term_title) |
-        Q(current_version__content__title__iexact=term_title)
-    )
-    if terms.exists():
+    if normalize_form(term_title) in forms:
         return '<a class="term" tabindex="0" title="{0}">{0}</a>'.format(
             term_title)
     else:
         return term_title
 
 
-def render_term(text):
+def find_references(text):
+    """Return the normalised surface forms linked to from text"""
+    if not text:
+        return []
+    return sorted({normalize_form(x) for x in re.findall(TERM_PAT, text)})
+
+
+def render_term(text, forms=None):
+    if forms is None:
+        forms = lexicon.forms()
     rendered = re.sub(
         TERM_PAT,
-        sub_callback,
+        functools.partial(sub_callback, forms=forms),
         str(text))
     rendered = rendered.replace(
         '<<your/an>>', 'your').replace('<<OrgScale>>', 'organization')
 
     return rendered
 
+
+# Fields render_fields() fills in
+RENDERED_FIELDS = [
+    'rendered_description', 'references', 'description_html',
+    'extended_description_html', 'render_version']
+
+
+def render_fields(description, extended_description, forms=None):
+    """
+    Render a description and extended description: rendered_description
+    keeps the description's markdown with its links resolved, the HTML
+    fields are what the detail page outputs
+    """
+    rendered = render_term(description, forms=forms)
+    extended = render_term(extended_description, forms=forms) \
+        if extended_description else ''
+    return {
+        'rendered_description': rendered,
+        'references': find_references(
+            '{}\n{}'.format(description or '', extended_description or '')),
+        'description_html': markdown_html(rendered) if description else '',
+        'extended_description_html': extended,
+        'render_version': RENDER_VERSION,
+    }
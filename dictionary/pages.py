@@ -0,0 +1,69 @@
+"""
+Page assembly for the term detail page.
+
+term_detail.html shows a content row together with its term's other
+languages, other versions, similar terms and concepts. Reached through
+the model properties each of those is a query of its own, several are
+repeated by the template and other languages cost one more query per
+language. term_page() loads each of them in one query, however many
+languages and versions the term has, and links the loaded objects to
+each other so the template's lookups hit no database. The lists are
+loaded lazily, so a page whose fragments are cached skips them.
+Descriptions are output as the HTML stored when they were saved; content
+stored by an older renderer keeps its HTML until rerender_descriptions
+--outdated brings it up to date.
+"""
+from django.shortcuts import get_object_or_404
+from django.utils.functional import SimpleLazyObject
+
+
+def term_page(language, slug, version):
+    """
+    The context for term_detail.html, in at most five queries: the
+    content with its version, term, current version and author, then the
+    term's other versions, latest content per language, similar terms and
+    concepts
+    """
+    from .models import Synonym
+    from .models import TermContent
+
+    termcontent = get_object_or_404(
+        TermContent.objects.select_related(
+            'version__term__current_version', 'author'),
+        version__number=version,
+        version__term__slug=slug.lower(),
+        language=language)
+
+    version = termcontent.version
+    term = version.term
+    if term.current_version is not None:
+        term.current_version.term = term
+
+    def other_versions():
+        versions = list(term.versions.exclude(pk=version.pk).filter(
+            draft=False))
+        for x in versions:
+            x.term = term
+        return versions
+
+    def other_languages():
+        # The latest content of each language is the one with the highest
+        # version number, which is what is_latest records
+        contents = list(TermContent.objects.filter(
+            version__term=term, is_latest=True
+        ).select_related('version').order_by('language'))
+        for x in contents:
+            x.version.term = term
+        return contents
+
+    # Loaded only if the template renders the fragment that shows them
+    return {
+        'termcontent': termcontent,
+        'version': version,
+        'term': term,
+        'other_languages': SimpleLazyObject(other_languages),
+        'other_versions': SimpleLazyObject(other_versions),
+        'similar': SimpleLazyObject(lambda: list(Synonym.objects.filter(
+            canonical_term=term, language=language))),
+        'concepts': SimpleLazyObject(lambda: list(term.concepts.all())),
+    }
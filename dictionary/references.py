@@ -0,0 +1,74 @@
+import threading
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import content_changed
+from .documents import flush_documents
+from .documents import queue_documents
+from .lexicon import normalize_form
+
+BATCH_SIZE = 200
+
+_pending = threading.local()
+
+
+def queue_rerender(forms):
+    """
+    Re-render the descriptions that link to any of forms once the current
+    transaction commits. Forms queued during one transaction are merged so
+    each affected row is rendered once.
+    """
+    forms = {normalize_form(x) for x in forms if x}
+    if not forms:
+        return
+    if not hasattr(_pending, 'forms'):
+        _pending.forms = set()
+    _pending.forms.update(forms)
+    transaction.on_commit(flush_rerender)
+
+
+def rerender_pending():
+    return bool(getattr(_pending, 'forms', None))
+
+
+def flush_rerender():
+    forms = getattr(_pending, 'forms', None)
+    _pending.forms = set()
+    if forms:
+        rerender_references(forms)
+    flush_documents()
+
+
+def rerender_references(forms, batch_size=BATCH_SIZE):
+    """
+    Re-render every TermContent whose descriptions link to one of forms.
+    Returns the number of rows updated.
+    """
+    from .models import RENDERED_FIELDS
+    from .models import TermContent
+    from .models import render_fields
+
+    matches = list(TermContent.objects.filter(
+        references__overlap=sorted(forms)
+    ).order_by(
+        'pk'
+    ).values_list('pk', 'version__term_id'))
+    ids = [pk for pk, term_id in matches]
+
+    for start in range(0, len(ids), batch_size):
+        rows = list(TermContent.objects.filter(
+            pk__in=ids[start:start + batch_size]
+        ).only('pk', 'description', 'extended_description'))
+        now = timezone.now()
+        for row in rows:
+            for field, value in render_fields(
+                    row.description, row.extended_description).items():
+                setattr(row, field, value)
+            row.modified = now
+        TermContent.objects.bulk_update(rows, RENDERED_FIELDS + ['modified'])
+
+    if ids:
+        queue_documents(term_id for pk, term_id in matches)
+        content_changed()
+    return len(ids)
@@ -0,0 +1,18 @@
+"""
+HTML for the term detail page, rendered when content is saved.
+
+Descriptions are markdown and extended descriptions are HTML from the
+editor; both have their [[links]] resolved before they get here. The
+output is exactly what the page's markdown and highlight_terms filters
+produced, so stored pages look as they did when rendered per request.
+Bump RENDER_VERSION whenever the output of this module or of render_term
+changes, then run manage.py rerender_descriptions --outdated.
+"""
+import markdown
+
+RENDER_VERSION = 2
+
+
+def markdown_html(text):
+    # As the markdown template filter, without extensions
+    return markdown.markdown(text or '')
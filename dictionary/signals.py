@@ -0,0 +1,204 @@
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from core.models import UserProfile
+from .cache import content_changed
+from .documents import queue_documents
+from .lexicon import lexicon
+from .lexicon import normalize_form
+from .models import Concept
+from .models import PluralTitle
+from .models import Synonym
+from .models import Term
+from .models import TermContent
+from .models import TermVersion
+from .references import queue_rerender
+from .snapshot import mark_snapshot_stale
+
+
+def term_surface_forms(term, version_ids):
+    """Every form a link to term could use through the given versions"""
+    plurals = PluralTitle.objects.filter(
+        term=term
+    ).values_list('plural_title', flat=True)
+    content_titles = TermContent.objects.filter(
+        version_id__in=[x for x in version_ids if x]
+    ).values_list('title', flat=True)
+    return {term.title} | set(plurals.union(content_titles))
+
+
+@receiver(post_save, sender=Term)
+@receiver(post_delete, sender=Term)
+@receiver(post_save, sender=TermVersion)
+@receiver(post_delete, sender=TermVersion)
+@receiver(post_save, sender=TermContent)
+@receiver(post_delete, sender=TermContent)
+@receiver(post_save, sender=Synonym)
+@receiver(post_delete, sender=Synonym)
+@receiver(post_save, sender=PluralTitle)
+@receiver(post_delete, sender=PluralTitle)
+@receiver(post_save, sender=Concept)
+@receiver(post_delete, sender=Concept)
+@receiver(m2m_changed, sender=Term.concepts.through)
+def dictionary_changed(sender, **kwargs):
+    content_changed()
+
+
+# API documents
+
+
+@receiver(post_save, sender=Term)
+def term_document(sender, instance, **kwargs):
+    queue_documents([instance.pk])
+
+
+@receiver(post_save, sender=TermVersion)
+@receiver(post_delete, sender=TermVersion)
+def version_document(sender, instance, **kwargs):
+    queue_documents([instance.term_id])
+
+
+@receiver(post_save, sender=TermContent)
+@receiver(post_delete, sender=TermContent)
+def content_document(sender, instance, **kwargs):
+    queue_documents([instance.version.term_id])
+
+
+@receiver(post_save, sender=Synonym)
+@receiver(post_delete, sender=Synonym)
+def synonym_document(sender, instance, **kwargs):
+    queue_documents([instance.canonical_term_id])
+
+
+@receiver(post_save, sender=Concept)
+@receiver(pre_delete, sender=Concept)
+def concept_document(sender, instance, **kwargs):
+    queue_documents(instance.term_set.values_list('pk', flat=True))
+    # Snapshots list every concept
+    mark_snapshot_stale()
+
+
+@receiver(m2m_changed, sender=Term.concepts.through)
+def term_concepts_document(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action in ('post_add', 'post_remove'):
+        queue_documents(pk_set if reverse else [instance.pk])
+    elif action == 'pre_clear':
+        queue_documents(
+            instance.term_set.values_list('pk', flat=True)
+            if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=UserProfile)
+def author_document(sender, instance, created, update_fields=None,
+                    **kwargs):
+    # Content lists its author by name
+    if created or update_fields and \
+            not {'first_name', 'last_name'} & set(update_fields):
+        return
+    queue_documents(TermContent.objects.filter(
+        author=instance
+    ).values_list('version__term_id', flat=True).distinct())
+
+
+def loaded_values(instance):
+    """
+    The stored values of the tracked fields of instance before this save,
+    or None if it was not loaded with all of them
+    """
+    loaded = getattr(instance, '_loaded', {})
+    if set(instance.TRACKED_FIELDS) <= set(loaded):
+        return loaded
+    return None
+
+
+@receiver(post_save, sender=Term)
+def term_saved(sender, instance, created, **kwargs):
+    lexicon.invalidate()
+
+    previous = None if created else loaded_values(instance)
+    if previous is None or previous['title'] != instance.title:
+        Term.objects.filter(pk=instance.pk).update_search_document()
+
+    if created or previous is None:
+        if instance.status == Term.PUBLISHED:
+            queue_rerender(term_surface_forms(
+                instance, [instance.current_version_id]))
+        return
+
+    if Term.PUBLISHED in (previous['status'], instance.status) and \
+            previous['status'] != instance.status:
+        # Documents of unpublished terms do not mark the snapshot
+        mark_snapshot_stale()
+    if previous['status'] != instance.status or \
+            previous['current_version_id'] != instance.current_version_id:
+        forms = term_surface_forms(
+            instance,
+            [previous['current_version_id'], instance.current_version_id])
+        queue_rerender(forms | {previous['title']})
+    elif previous['title'] != instance.title:
+        queue_rerender([previous['title'], instance.title])
+
+
+@receiver(post_delete, sender=Term)
+def term_deleted(sender, instance, **kwargs):
+    lexicon.invalidate()
+    if instance.status == Term.PUBLISHED:
+        mark_snapshot_stale()
+    queue_rerender([instance.title])
+
+
+@receiver(post_save, sender=PluralTitle)
+def plural_saved(sender, instance, created, **kwargs):
+    lexicon.invalidate()
+    previous = None if created else loaded_values(instance)
+    queue_rerender([
+        instance.plural_title, previous and previous['plural_title']])
+
+
+@receiver(post_delete, sender=PluralTitle)
+def plural_deleted(sender, instance, **kwargs):
+    lexicon.invalidate()
+    queue_rerender([instance.plural_title])
+
+
+@receiver(post_save, sender=Synonym)
+@receiver(post_delete, sender=Synonym)
+def synonym_changed(sender, instance, **kwargs):
+    Term.objects.filter(
+        pk=instance.canonical_term_id
+    ).update_search_document()
+
+
+@receiver(post_save, sender=TermContent)
+def content_saved(sender, instance, created, **kwargs):
+    previous_title = getattr(instance, '_loaded', {}).get('title')
+    if not created and previous_title == instance.title:
+        return
+    # Only titles feed the lexicon, and only a new form or the loss of a
+    # known one can change it
+    forms = lexicon.forms()
+    added = instance.title and normalize_form(instance.title) not in forms
+    removed = previous_title and normalize_form(previous_title) in forms
+    if added or removed:
+        lexicon.invalidate()
+        queue_rerender([previous_title, instance.title])
+
+
+@receiver(post_delete, sender=TermContent)
+def content_deleted(sender, instance, **kwargs):
+    lexicon.invalidate()
+    queue_rerender([instance.title])
+
+    # Promote the next most recent version in this language
+    if instance.is_latest:
+        TermContent.objects.filter(
+            version__term__versions=instance.version_id,
+            language=instance.language
+        ).update_latest()
+        Term.objects.filter(
+            versions=instance.version_id
+        ).update_search_document()
@@ -0,0 +1,122 @@
+"""
+Full dictionary snapshots.
+
+A snapshot is the published dictionary as one JSON file, named after a
+hash of its content so it can be cached forever, with gzip and, when the
+brotli package is installed, brotli variants written next to it. A small
+manifest points at the latest one. Changes to published terms only mark
+the snapshot stale; building one reads the whole dictionary, so it is left
+to a periodic `build_snapshot --if-stale`. Files older than the snapshot a
+build replaces are deleted.
+"""
+import gzip
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from .documents import render_documents
+from .documents import serializable_terms
+from .models import Concept
+from .models import Term
+
+SNAPSHOT_DIR = 'snapshots'
+MANIFEST_NAME = '{}/manifest.json'.format(SNAPSHOT_DIR)
+MANIFEST_KEY = 'dictionary:snapshot-manifest'
+STALE_KEY = 'dictionary:snapshot-stale'
+
+
+def snapshot_content():
+    """The published terms, as the list API returns them, and concepts"""
+    terms = Term.objects.listed().only('id', 'api_document')
+    documents = [(x.pk, x.api_document) for x in terms]
+    missing = [pk for pk, document in documents if document is None]
+    if missing:
+        rendered = render_documents(
+            serializable_terms().filter(pk__in=missing))
+        documents = [
+            (pk, document or rendered[pk]) for pk, document in documents]
+    concepts = [
+        {'id': pk, 'title': title}
+        for pk, title in Concept.objects.order_by(
+            'title').values_list('id', 'title')]
+    return '{{"concepts":{},"terms":[{}]}}'.format(
+        json.dumps(concepts, ensure_ascii=False, separators=(',', ':')),
+        ','.join(document for pk, document in documents)
+    ).encode('utf-8'), len(documents)
+
+
+def write_file(name, content):
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(content))
+    return default_storage.url(name)
+
+
+def build_snapshot():
+    """
+    Write a snapshot, point the manifest at it and delete the snapshots
+    before the one it replaces
+    """
+    # Changes made while this build reads the dictionary mark it again
+    cache.delete(STALE_KEY)
+    previous = get_manifest()
+    content, count = snapshot_content()
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    name = '{}/dictionary.{}.json'.format(SNAPSHOT_DIR, digest)
+
+    manifest = {
+        'hash': digest,
+        'generated': timezone.now().isoformat(),
+        'terms': count,
+        'size': len(content),
+        'url': write_file(name, content),
+        'gzip': write_file(
+            name + '.gz', gzip.compress(content, 9, mtime=0)),
+    }
+    if brotli is not None:
+        manifest['brotli'] = write_file(
+            name + '.br', brotli.compress(content))
+
+    if default_storage.exists(MANIFEST_NAME):
+        default_storage.delete(MANIFEST_NAME)
+    default_storage.save(
+        MANIFEST_NAME, ContentFile(json.dumps(manifest).encode('utf-8')))
+    cache.set(MANIFEST_KEY, manifest, None)
+    # Keep the replaced snapshot for clients that read the old manifest
+    prune_snapshots({digest, previous and previous['hash']})
+    return manifest
+
+
+def prune_snapshots(keep):
+    """Delete the snapshot files of every hash not in keep"""
+    directories, files = default_storage.listdir(SNAPSHOT_DIR)
+    for name in files:
+        prefix, digest, *extensions = name.split('.')
+        if prefix == 'dictionary' and extensions and digest not in keep:
+            default_storage.delete('{}/{}'.format(SNAPSHOT_DIR, name))
+
+
+def get_manifest():
+    manifest = cache.get(MANIFEST_KEY)
+    if manifest is None and default_storage.exists(MANIFEST_NAME):
+        with default_storage.open(MANIFEST_NAME) as f:
+            manifest = json.loads(f.read().decode('utf-8'))
+        cache.set(MANIFEST_KEY, manifest, None)
+    return manifest
+
+
+def mark_snapshot_stale():
+    """Have the next build_snapshot --if-stale write a new snapshot"""
+    cache.set(STALE_KEY, True, None)
+
+
+def snapshot_stale():
+    return bool(cache.get(STALE_KEY)) or get_manifest() is None
@@ -131,11 +131,11 @@ var TermManager = function() {
     self.terms = ko.observableArray();
     self.filter = ko.observable();
     self.totalCount = ko.observable();
-    self.page = ko.observable(1);
+    self.next = ko.observable();
     self.loading = ko.observable(false);
-    self.languages = ko.observableArray(languages);
+    self.languages = ko.observableArray();
     self.filterCountry = ko.observable();
-    self.countries = ko.observable(countries);
+    self.countries = ko.observableArray();
     self.concepts = ko.observableArray();
     self.filterConcept = ko.observable();
     self.filterLanguage = ko.observable();
@@ -161,20 +161,84 @@ var TermManager = function() {
         return self.filterLanguage() && rtlLanguages.indexOf(self.filterLanguage().code) >= 0;
     });
     self.hasMore = ko.computed(function() {
-        return self.terms().length < self.totalCount();
+        return !!self.next();
     });
     self.filter.extend({rateLimit: 500});
     self.load = function() {
         ko.applyBindings(self);
         self.search();
-        self.concepts([]);
-        $.get('/api/v1/dictionary/concepts/').done(function(data) {
-            $.each(data, function(index, value) {
-                self.concepts.push(value.title);
+        self.loadSnapshot();
+        $.get('/api/v1/dictionary/facets/').done(function(data) {
+            self.countries(data.countries);
+            self.languages(data.languages);
+            self.concepts(data.concepts);
+        });
+    }
+
+    // Every published term, from the latest snapshot once it has loaded.
+    // Browsing and filtering then happen here, searches still go to the
+    // API, which ranks them
+    self.snapshot = null;
+    self.pageSize = 20;
+
+    self.loadSnapshot = function() {
+        $.get('/api/v1/dictionary/snapshot/').done(function(manifest) {
+            $.ajax({url: manifest.url, dataType: 'json'}).done(function(data) {
+                self.snapshot = data.terms;
             });
         });
     }
 
+    self.matches = function(term) {
+        if(self.filterCountry() && (term.country || '').toUpperCase() !==
+                self.filterCountry().code.toUpperCase()) {
+            return false;
+        }
+        if(self.filterLanguage() && !term.content.some(function(content) {
+                return content.language === self.filterLanguage().code;
+            })) {
+            return false;
+        }
+        if(self.filterConcept() && !term.concepts.some(function(concept) {
+                return concept.toLowerCase() ===
+                    self.filterConcept().toLowerCase();
+            })) {
+            return false;
+        }
+        return true;
+    }
+
+    self.browse = function(clearResults) {
+        var terms = $.grep(self.snapshot, self.matches);
+        if(clearResults) {
+            self.terms([]);
+        }
+        // Snapshots are in the API's title order, so this also continues a
+        // page loaded from the API
+        var start = self.terms().length;
+        var end = start + self.pageSize;
+        self.totalCount(terms.length);
+        self.next(end < terms.length ? 'snapshot' : null);
+        $.each(terms.slice(start, end), function(index, value) {
+            self.addTerm(value);
+        });
+    }
+
+    self.addTerm = function(value) {
+        var term = new Term(value);
+        sessionStorage.setItem(term.id(), 'en');
+
+        // Display translation if filterLanguage is selected
+        if(self.filterLanguage()) {
+            $.each(term.languages(), function(index, value) {
+                if(value == self.filterLanguage().code) {
+                    term.currentLanguage(value);
+                }
+            });
+        }
+        self.terms.push(term);
+    }
+
     self.clearFilters = function() {
         self.filter(null);
         self.filterCountry(null);
@@ -184,8 +248,6 @@ var TermManager = function() {
     }
 
     self.showMore = function() {
-        //TODO handle paging properly
-        self.page(self.page() + 1);
         self.search(false);
     }
 
@@ -204,44 +266,43 @@ var TermManager = function() {
     //}
 
     self.search = function(clearResults) {
-        self.loading(true);
-        if(clearResults) {
-            self.page(1);
-        }
-        var args = {
-            page: self.page()
-        }
-        if(self.filter()) {
-            args.q = self.filter();
-        }
-        if(self.filterCountry()) {
-            args.country = self.filterCountry().code;
+        if(self.snapshot && !self.filter()) {
+            self.browse(clearResults);
+            return;
         }
-        if(self.filterLanguage()) {
-            args.language = self.filterLanguage().code;
-        }
-        if(self.filterConcept()) {
-            args.concept = self.filterConcept();
+        self.loading(true);
+        var url = '/api/v1/dictionary/';
+        var args = {};
+        if(!clearResults && self.next()) {
+            // The next link carries the filters, keep it on this origin
+            url = self.next().replace(/^https?:\/\/[^\/]+/, '');
+        } else {
+            if(self.filter()) {
+                // Ranked searches are paged by number
+                args.q = self.filter();
+            } else {
+                // Browse with cursors, which cost the same on every page
+                args.cursor = '';
+            }
+            if(self.filterCountry()) {
+                args.country = self.filterCountry().code;
+            }
+            if(self.filterLanguage()) {
+                args.language = self.filterLanguage().code;
+            }
+            if(self.filterConcept()) {
+                args.concept = self.filterConcept();
+            }
         }
 
-        $.get('/api/v1/dictionary/', args).done(function(data) {
+        $.get(url, args).done(function(data) {
             if(clearResults) {
                 self.terms([]);
             }
             self.totalCount(data.count);
+            self.next(data.next);
             $.each(data.results, function(index, value) {
-                var term = new Term(value);
-                sessionStorage.setItem(term.id(), 'en');
-
-                // Display translation if filterLanguage is selected
-                if(self.filterLanguage()) {
-                    $.each(term.languages(), function(index, value) {
-                        if(value == self.filterLanguage().code) {
-                            term.currentLanguage(value);
-                        }
-                    });
-                }
-                self.terms.push(term);
+                self.addTerm(value);
             });
 
             self.loading(false);
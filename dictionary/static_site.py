@@ -0,0 +1,179 @@
+"""
+The public dictionary as static HTML.
+
+Every published term page, the index and the flat pages are rendered
+through their views and written to default_storage under SITE_DIR, each
+as index.html in a directory named after its URL, so the site can be
+served from object storage or a CDN. The old term URLs that redirect
+to a term page are written as pages that refresh to it. Each page has a
+fingerprint of what it is rendered from, recorded in a manifest next to
+the pages; a build renders only pages whose fingerprint changed and
+deletes pages that are no longer published. Bump SITE_VERSION whenever
+the templates change, or build with --full.
+"""
+import hashlib
+import json
+import logging
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.flatpages.views import flatpage
+from django.contrib.sites.models import Site
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import RequestFactory
+from django.urls import resolve
+from django.urls import reverse
+from django.utils.html import format_html
+
+from core.models import TextBlock
+from .models import Term
+from .models import TermContent
+from .rendering import RENDER_VERSION
+
+SITE_VERSION = 1
+SITE_DIR = 'site'
+MANIFEST_NAME = 'manifest.json'
+
+REDIRECT_PAGE = (
+    '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+    '<title>Redirecting</title><link rel="canonical" href="{0}">'
+    '<meta http-equiv="refresh" content="0; url={0}"></head>'
+    '<body><a href="{0}">{0}</a></body></html>\n')
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(*parts):
+    return hashlib.md5(
+        json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+
+def site_fingerprint():
+    """What every page is rendered from: the templates and text blocks"""
+    # The textblock tag creates missing blocks empty, so a build must not
+    # tell the two apart
+    blocks = TextBlock.objects.exclude(text='').order_by('slug')
+    return fingerprint(
+        SITE_VERSION, RENDER_VERSION, list(blocks.values_list('slug', 'text')))
+
+
+def site_pages():
+    """
+    {url: fingerprint} of every page of the public site. Term pages change
+    with their content and their term, which is stamped whenever anything
+    else on the page changes. Redirects change with the page they point
+    to; pages take precedence over redirects with the same URL.
+    """
+    common = site_fingerprint()
+    pages = {reverse('index'): common}
+    redirects = {}
+
+    rows = TermContent.objects.filter(
+        version__term__status=Term.PUBLISHED,
+        version__draft=False,
+    ).values_list(
+        'language', 'version__term__slug', 'version__number', 'modified',
+        'version__term__modified', 'version__term_id',
+        'version__term__current_version__number')
+    for (language, slug, number, modified, term_modified, term_id,
+         current) in rows:
+        url = reverse('term-detail', args=[language, slug, number])
+        pages[url] = fingerprint(common, modified, term_modified)
+        target = fingerprint(SITE_VERSION, url)
+        redirects[reverse(
+            'term-detail-redirect-code',
+            args=[term_id, number, language])] = target
+        if number == current:
+            redirects[reverse(
+                'term-detail-redirect-a', args=[language, slug])] = target
+            if language == 'en':
+                redirects[reverse(
+                    'term-detail-redirect-b', args=[slug])] = target
+
+    flatpages = FlatPage.objects.filter(
+        sites=Site.objects.get_current(), registration_required=False
+    ).values_list('url', 'title', 'content', 'template_name')
+    for url, *fields in flatpages:
+        pages[url] = fingerprint(common, *fields)
+
+    for url, value in redirects.items():
+        pages.setdefault(url, value)
+    return pages
+
+
+def page_name(url, root=SITE_DIR):
+    return '{}/{}index.html'.format(root, url.lstrip('/'))
+
+
+def render_page(url):
+    """The HTML of url, or None if it does not render"""
+    # As requested from the site itself, which ALLOWED_HOSTS lets in
+    request = RequestFactory(
+        HTTP_HOST=Site.objects.get_current().domain).get(url)
+    request.user = AnonymousUser()
+    if FlatPage.objects.filter(url=url).exists():
+        response = flatpage(request, url)
+    else:
+        match = resolve(url)
+        response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response = response.render()
+    if response.status_code in (301, 302):
+        return format_html(
+            REDIRECT_PAGE, response['Location']).encode('utf-8')
+    if response.status_code != 200:
+        return None
+    return response.content
+
+
+def write_page(name, content):
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(content))
+
+
+def build_pages(urls, root=SITE_DIR):
+    """Render and write urls, returning those that did not render"""
+    failed = []
+    for url in urls:
+        try:
+            content = render_page(url)
+        except Exception:
+            # One broken page must not stop the build
+            logger.exception('Could not render %s', url)
+            content = None
+        if content is None:
+            failed.append(url)
+        else:
+            write_page(page_name(url, root), content)
+    return failed
+
+
+def read_manifest(root=SITE_DIR):
+    name = '{}/{}'.format(root, MANIFEST_NAME)
+    if not default_storage.exists(name):
+        return {}
+    with default_storage.open(name) as f:
+        return json.loads(f.read().decode('utf-8'))
+
+
+def write_manifest(pages, root=SITE_DIR):
+    write_page(
+        '{}/{}'.format(root, MANIFEST_NAME),
+        json.dumps(pages, sort_keys=True).encode('utf-8'))
+
+
+def plan_build(pages, manifest):
+    """The urls to render and the urls to delete"""
+    changed = sorted(
+        url for url, value in pages.items() if manifest.get(url) != value)
+    removed = sorted(set(manifest) - set(pages))
+    return changed, removed
+
+
+def remove_pages(urls, root=SITE_DIR):
+    for url in urls:
+        name = page_name(url, root)
+        if default_storage.exists(name):
+            default_storage.delete(name)
@@ -0,0 +1,74 @@
+"""
+Search-as-you-type suggestions for the embed widget.
+
+Suggestions are published terms whose latest title or acronym in a
+language starts with what has been typed so far. Results are kept in a
+per-process LRU keyed on the content generation, so repeated prefixes,
+which is most of what a widget sends, are answered without touching the
+database, and an edit makes every kept result unreachable at once.
+"""
+from functools import lru_cache
+
+from django.db.models import Case
+from django.db.models import IntegerField
+from django.db.models import Q
+from django.db.models import Value
+from django.db.models import When
+from django.urls import reverse
+
+from .cache import get_generation
+from .lookups import EXACT
+from .lookups import PREFIX
+
+SUGGEST_SIZE = 10
+MAX_SUGGEST_SIZE = 50
+MAX_PREFIX_LENGTH = 100
+LRU_SIZE = 2048
+
+
+def suggest(language, prefix, limit=SUGGEST_SIZE):
+    """Up to limit suggestions for prefix in language, best first"""
+    prefix = ' '.join(prefix.split())[:MAX_PREFIX_LENGTH].lower()
+    limit = max(1, min(limit, MAX_SUGGEST_SIZE))
+    if not prefix:
+        return []
+    return list(_suggest(get_generation(), language, prefix, limit))
+
+
+def suggest_stats():
+    return _suggest.cache_info()
+
+
+@lru_cache(maxsize=LRU_SIZE)
+def _suggest(generation, language, prefix, limit):
+    from .models import Term
+    from .models import TermContent
+
+    def prefix_q(lookup):
+        return Q(**{'title__' + lookup: prefix}) | \
+            Q(**{'acronym__' + lookup: prefix})
+
+    rows = TermContent.objects.filter(
+        prefix_q(PREFIX),
+        is_latest=True,
+        language=language,
+        version__term__status=Term.PUBLISHED,
+    ).annotate(
+        exact=Case(
+            When(prefix_q(EXACT), then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField())
+    ).order_by(
+        'exact', 'title', 'id'
+    ).values_list(
+        'id', 'title', 'acronym', 'version__term__slug', 'version__number'
+    )[:limit]
+    # A tuple, so a cached result cannot be changed by whoever gets it
+    return tuple(
+        {
+            'id': pk,
+            'title': title,
+            'acronym': acronym or None,
+            'url': reverse('term-detail', args=[language, slug, number]),
+        }
+        for pk, title, acronym, slug, number in rows)
@@ -1,5 +1,9 @@
 from django import template
+from django.core.cache import cache
 
+from dictionary.cache import PAGE_TIMEOUT
+from dictionary.cache import fragment_key
+from dictionary.cache import record_fragment
 from dictionary.models import render_term
 
 register = template.Library()
@@ -9,3 +13,46 @@ register = template.Library()
 def highlight_terms(text):
     return render_term(text)
 
+
+class FragmentNode(template.Node):
+
+    def __init__(self, nodelist, name, parts):
+        self.nodelist = nodelist
+        self.name = name
+        self.parts = parts
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        key = fragment_key(name, [x.resolve(context) for x in self.parts])
+        content = cache.get(key)
+        if content is None:
+            stat = 'miss'
+            content = self.nodelist.render(context)
+            cache.set(key, content, PAGE_TIMEOUT)
+        else:
+            stat = 'hit'
+        if 'request' in context:
+            record_fragment(context['request'], name, stat)
+        return content
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    Cache the enclosed template under a name and key values, which should
+    include the modified times of the rows it shows so it is rendered again
+    exactly when they change:
+
+        {% fragment 'term-card' termcontent.modified term.modified %}
+            ...
+        {% endfragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            "'fragment' takes a name and the values to key it on")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(
+        nodelist, parser.compile_filter(bits[1]),
+        [parser.compile_filter(x) for x in bits[2:]])
@@ -1,7 +1,22 @@
+import datetime
+import json
+import time
+
 import pytest
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db import connection
 from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 
+from ..api.v1.views import TermListView
+from ..cache import GENERATION_TIME_KEY
+from ..cache import cache_stats
+from ..documents import update_documents
 from ..models import Concept
+from ..models import PluralTitle
+from ..models import Synonym
 from ..models import Term
 from ..models import TermVersion
 from ..models import TermContent
@@ -47,47 +62,533 @@ def test_term_list(client):
 
     resp = client.get(reverse('api:term-list'))
     assert resp.status_code == 200
-    results = resp.data['results']
+    results = resp.json()['results']
     assert len(results) == 2
 
     # Search by title
     resp = client.get(reverse('api:term-list') + '?title=Term 1')
-    results = resp.data['results']
+    results = resp.json()['results']
     assert len(results) == 1
     assert results[0]['id'] == version1.id
 
+    # Titles are content and plural titles, not the term's own
+    resp = client.get(reverse('api:term-list') + '?title=le term 1')
+    assert [x['id'] for x in resp.json()['results']] == [term1.id]
+    PluralTitle.objects.create(term=term2, plural_title='Terms 2')
+    Term.objects.filter(pk=term2.pk).update(title='Renamed')
+    resp = client.get(reverse('api:term-list') + '?title=Renamed')
+    assert resp.json()['results'] == []
+    resp = client.get(reverse('api:term-list') + '?title=terms 2')
+    assert [x['id'] for x in resp.json()['results']] == [term2.id]
+
     # Search by language
     resp = client.get(reverse('api:term-list') + '?language=fr')
-    results = resp.data['results']
+    results = resp.json()['results']
     assert len(results) == 1
     assert results[0]['id'] == version1.id
 
     resp = client.get(reverse('api:term-list') + '?language=ar')
-    results = resp.data['results']
+    results = resp.json()['results']
     assert len(results) == 0
 
     # Search by country
     resp = client.get(reverse('api:term-list') + '?country=AU')
-    results = resp.data['results']
+    results = resp.json()['results']
     assert len(results) == 1
     assert results[0]['id'] == version2.id
 
     # Search by concept
     resp = client.get(reverse('api:term-list') + '?concept=test concept')
-    results = resp.data['results']
+    results = resp.json()['results']
     assert len(results) == 1
     assert results[0]['id'] == version1.id
 
     # Search by text
     resp = client.get(reverse('api:term-list') + '?q=description')
-    results = resp.data['results']
+    results = resp.json()['results']
     assert len(results) == 1
     assert results[0]['id'] == version2.id
 
     resp = client.get(reverse('api:term-list') + '?q=term')
-    results = resp.data['results']
+    results = resp.json()['results']
     assert len(results) == 2
 
     resp = client.get(reverse('api:term-list') + '?q=aardvark')
-    results = resp.data['results']
+    results = resp.json()['results']
     assert len(results) == 0
+
+    # Synonyms are part of the search document
+    Synonym.objects.create(
+        title='Anteater', slug='anteater', canonical_term=term2)
+    resp = client.get(reverse('api:term-list') + '?q=anteater')
+    results = resp.json()['results']
+    assert len(results) == 1
+    assert results[0]['id'] == version2.id
+
+
+@pytest.mark.django_db
+def test_ranked_search(client, django_assert_num_queries):
+    def create(title, **kwargs):
+        term = Term.objects.create(title=title, status=Term.PUBLISHED)
+        version = TermVersion.objects.create(term=term)
+        term.current_version = version
+        term.save()
+        TermContent.objects.create(
+            version=version, title=title, is_latest=True, **kwargs)
+        return version.pk
+
+    fulltext = create('Model', description='Models of the BIM process')
+    prefix = create('Bimetal', description='')
+    exact = create('BIM', description='')
+    acronym = create(
+        'Building Information Modelling', acronym='BIM', description='')
+    create('Wall', description='Walls')
+    update_documents(Term.objects.values_list('pk', flat=True))
+
+    # Best first, from one query for the page besides validators and count
+    with django_assert_num_queries(3):
+        resp = client.get(reverse('api:term-list'), {'q': 'bim'})
+    assert [x['id'] for x in resp.json()['results']] == [
+        acronym, exact, prefix, fulltext]
+
+    resp = client.get(reverse('api:term-list'), {
+        'q': 'bim', 'language': 'en'})
+    assert [x['id'] for x in resp.json()['results']] == [
+        acronym, exact, prefix, fulltext]
+
+    # Cursor pages keep the rank order
+    resp = client.get(reverse('api:term-list'), {
+        'q': 'bim', 'cursor': '', 'page_size': 1})
+    ids = [x['id'] for x in resp.json()['results']]
+    while resp.json()['next']:
+        resp = client.get(resp.json()['next'])
+        ids += [x['id'] for x in resp.json()['results']]
+    assert ids == [acronym, exact, prefix, fulltext]
+
+    qs = TermListView().rank_terms(
+        Term.objects.filter(status=Term.PUBLISHED), 'bim')
+    # Full-text hits come from the search document's index, and the terms
+    # are sorted on the score alone: no DISTINCT over every column and no
+    # query per kind of hit
+    with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+    plan = qs.explain()
+    assert 'DISTINCT' not in str(qs.query)
+    assert 'Seq Scan on dictionary_term ' not in plan
+    assert 'Index Cond: (search_document @@' in plan
+    sort_key = next(x for x in plan.splitlines() if 'Sort Key' in x)
+    assert sort_key.endswith(
+        'DESC, dictionary_term.title, dictionary_term.id')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_facets(client, userprofile, django_assert_num_queries):
+    create_terms(3, userprofile)
+    Term.objects.filter(title='Term 000').update(country='au')
+    Term.objects.filter(title='Term 001').update(country='AU')
+    Term.objects.create(
+        title='Suggested', country='NZ', status=Term.SUGGESTED)
+    url = reverse('api:facets')
+
+    # One query per facet, then none until the dictionary changes
+    with django_assert_num_queries(3):
+        resp = client.get(url)
+    with django_assert_num_queries(0):
+        assert client.get(url).json() == resp.json()
+    assert resp.json() == {
+        'countries': [{'code': 'AU', 'name': 'Australia', 'count': 2}],
+        'languages': [
+            {'code': 'en', 'name': 'English', 'count': 3},
+            {'code': 'fr', 'name': 'Français', 'count': 3}],
+        'concepts': [{
+            'id': Concept.objects.get().pk, 'title': 'Test Concept',
+            'count': 3}],
+    }
+
+    term = Term.objects.get(title='Term 002')
+    term.status = Term.ARCHIVED
+    term.save()
+    resp = client.get(url)
+    assert [x['count'] for x in resp.json()['languages']] == [2, 2]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_suggest(client, django_assert_num_queries):
+    for title, acronym, language in [
+            ('Building Information Modelling', 'BIM', 'en'),
+            ('Bill of Quantities', 'BoQ', 'en'),
+            ('Bim', None, 'en'),
+            ('Bâtiment', None, 'fr'),
+            ('Wall', None, 'en')]:
+        term = Term.objects.create(title=title, status=Term.PUBLISHED)
+        version = TermVersion.objects.create(term=term)
+        TermContent.objects.create(
+            version=version, title=title, acronym=acronym,
+            language=language, description='', is_latest=True)
+    url = reverse('api:suggest')
+
+    resp = client.get(url, {'q': 'bi'})
+    assert [x['title'] for x in resp.json()['results']] == [
+        'Bill of Quantities', 'Bim', 'Building Information Modelling']
+
+    # Exact titles and acronyms come first
+    resp = client.get(url, {'q': 'BIM'})
+    results = resp.json()['results']
+    assert [x['title'] for x in results] == [
+        'Bim', 'Building Information Modelling']
+    assert results[1]['acronym'] == 'BIM'
+    assert results[1]['url'].endswith('/en/building-information-modelling/1/')
+
+    resp = client.get(url, {'q': 'b', 'language': 'fr', 'limit': 5})
+    assert [x['title'] for x in resp.json()['results']] == ['Bâtiment']
+
+    # Repeated prefixes are answered from memory until the dictionary
+    # changes
+    with django_assert_num_queries(0):
+        resp = client.get(url, {'q': 'bim '})
+    assert len(resp.json()['results']) == 2
+    term = Term.objects.get(title='Bim')
+    term.status = Term.ARCHIVED
+    term.save()
+    resp = client.get(url, {'q': 'bim'})
+    assert len(resp.json()['results']) == 1
+
+    assert client.get(url).json()['results'] == []
+
+    # Browsers revalidate against the generation, which an edit bumps
+    resp = client.get(url, {'q': 'bi'})
+    assert resp['Cache-Control'] == 'public, no-cache'
+    etag = resp['ETag']
+    assert client.get(
+        url, {'q': 'bi'}, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    term.status = Term.PUBLISHED
+    term.save()
+    resp = client.get(url, {'q': 'bi'}, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert len(resp.json()['results']) == 3
+
+    resp = client.get(url, {'q': 'b', 'language': 'xx'})
+    assert resp.status_code == 400
+    resp = client.get(url, {'q': 'b', 'limit': -5})
+    assert len(resp.json()['results']) == 1
+
+
+@pytest.mark.django_db
+def test_search_language_config(client):
+    term = Term.objects.create(title='House', status=Term.PUBLISHED)
+    version = TermVersion.objects.create(term=term)
+    term.current_version = version
+    term.save()
+    TermContent.objects.create(
+        version=version, title='House', description='Houses are built')
+    content = TermContent.objects.create(
+        version=version, title='Haus', description='Die Häuser werden gebaut',
+        language='de')
+
+    # German stemming matches the singular against the plural
+    resp = client.get(reverse('api:term-list') + '?q=haus&language=de')
+    assert [x['id'] for x in resp.json()['results']] == [version.id]
+
+    resp = client.get('/api/v1/dictionary/simple/?q=haus&language=de')
+    assert [x['id'] for x in resp.json()['results']] == [content.id]
+
+    resp = client.get('/api/v1/dictionary/simple/?q=haus&language=en')
+    assert resp.json()['results'] == []
+
+    # The set-based rebuild agrees with save()
+    def stored():
+        # A fresh query each time, not a cached QuerySet
+        return list(TermContent.objects.order_by('pk').values_list(
+            'search_vector', flat=True))
+
+    before = stored()
+    TermContent.objects.update(search_vector=None)
+    assert stored() != before
+    TermContent.objects.all().update_search_vector()
+    assert stored() == before
+
+
+@pytest.mark.django_db
+def test_export(client):
+    concept = Concept.objects.create(title='Test Concept')
+    term = Term.objects.create(title='Term 1', status=Term.PUBLISHED)
+    term.concepts.add(concept)
+    version = TermVersion.objects.create(term=term)
+    term.current_version = version
+    term.save()
+    TermContent.objects.create(
+        version=version, title='Term 1', description='See [[Term 1]]',
+        language='en')
+    TermContent.objects.create(
+        version=version, title='Le Term 1', description='', language='fr')
+    Term.objects.create(title='Draft', status=Term.SUGGESTED)
+
+    url = reverse('api:export', args=['ndjson'])
+    resp = client.get(url)
+    assert resp.status_code == 200
+    lines = b''.join(resp.streaming_content).decode().splitlines()
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert record['concepts'] == ['Test Concept']
+    assert [x['language'] for x in record['content']] == ['en', 'fr']
+
+    resp = client.get(reverse('api:export', args=['csv']))
+    rows = b''.join(resp.streaming_content).decode().splitlines()
+    assert rows[0].startswith('term_id,slug,term_title')
+    assert len(rows) == 3
+
+    resp = client.get(reverse('api:export', args=['jsonld']))
+    graph = json.loads(b''.join(resp.streaming_content))['@graph']
+    assert graph[0]['@type'] == 'skos:ConceptScheme'
+    assert graph[1]['skos:definition'][0]['@value'] == 'See Term 1'
+
+    resp = client.get(reverse('api:export', args=['xml']))
+    assert resp.status_code == 404
+
+
+def create_terms(count, author):
+    concept = Concept.objects.create(title='Test Concept')
+    terms = Term.objects.bulk_create([
+        Term(title='Term {:03}'.format(i), slug='term-{}'.format(i),
+             status=Term.PUBLISHED)
+        for i in range(count)])
+    versions = TermVersion.objects.bulk_create([
+        TermVersion(term=term, number=1, draft=False) for term in terms])
+    for term, version in zip(terms, versions):
+        term.current_version = version
+    Term.objects.bulk_update(terms, ['current_version'])
+    Term.concepts.through.objects.bulk_create([
+        Term.concepts.through(term=term, concept=concept) for term in terms])
+    TermContent.objects.bulk_create([
+        TermContent(
+            version=version, title=version.term.title, language=language,
+            description='Description', is_latest=True, author=author)
+        for version in versions for language in ['en', 'fr']])
+    Synonym.objects.bulk_create([
+        Synonym(canonical_term=term, title='Synonym {}'.format(term.slug),
+                language='en')
+        for term in terms])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page_size', [20, 200])
+def test_term_list_queries(client, userprofile, page_size,
+                           django_assert_num_queries):
+    userprofile.first_name = 'Test'
+    userprofile.save()
+    create_terms(page_size, userprofile)
+    Site.objects.get_current()
+
+    # Terms without a stored document are serialized on the fly:
+    # validators, count, the page, then terms, versions, latest content
+    # with authors, synonyms and concepts, whatever the page size
+    url = reverse('api:term-list') + '?page_size={}'.format(page_size)
+    with django_assert_num_queries(8):
+        resp = client.get(url)
+    live = resp.json()
+
+    # Stored documents are spliced into the page as they are
+    update_documents(Term.objects.values_list('pk', flat=True))
+    # Published terms without a version have no document and are not
+    # listed, rather than serialized on every request
+    Term.objects.create(title='Term 000a', status=Term.PUBLISHED)
+    cache.clear()
+    with django_assert_num_queries(3):
+        resp = client.get(url)
+    assert resp.json() == live
+    results = resp.json()['results']
+    assert len(results) == page_size
+    content = sorted(results[0]['content'], key=lambda x: x['language'])
+    assert [x['similar'] for x in content] == [['Synonym term-0'], []]
+    assert results[0]['content'][0]['author'] == 'Test'
+    assert results[0]['concepts'] == ['Test Concept']
+
+
+@pytest.mark.django_db
+def test_term_list_fields(client, userprofile, django_assert_num_queries):
+    create_terms(5, userprofile)
+    Site.objects.get_current()
+    url = reverse('api:term-list')
+
+    # Only the requested relations are queried: validators, count and page
+    with django_assert_num_queries(3):
+        resp = client.get(url, {'fields': 'id,title'})
+    assert [set(x) for x in resp.json()['results']] == [{'id', 'title'}] * 5
+
+    # Plus versions and the latest content in the requested languages
+    with django_assert_num_queries(5):
+        resp = client.get(url, {
+            'fields': 'title,content.title,content.language',
+            'content_language': 'fr'})
+    result = resp.json()['results'][0]
+    assert result == {
+        'title': 'Term 000',
+        'content': [{'title': 'Term 000', 'language': 'fr'}]}
+
+    resp = client.get(url, {'content_language': 'en,fr'})
+    content = resp.json()['results'][0]['content']
+    assert sorted(x['language'] for x in content) == ['en', 'fr']
+    assert content[0]['similar'] is not None
+
+    resp = client.get(url, {'fields': 'id,content.nonsense'})
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+def test_renderers(client, userprofile):
+    msgpack = pytest.importorskip('msgpack')
+    create_terms(3, userprofile)
+    url = reverse('api:term-list') + '?fields=id,title,content'
+
+    resp = client.get(url)
+    assert resp['Content-Type'] == 'application/json'
+    data = resp.json()
+    assert resp.content == JSONRenderer().render(data)
+
+    resp = client.get(url, HTTP_ACCEPT='application/msgpack')
+    assert resp['Content-Type'] == 'application/msgpack'
+    assert msgpack.unpackb(resp.content, raw=False) == data
+
+    # Each representation has its own ETag
+    etag = client.get(url)['ETag']
+    assert resp['ETag'] != etag
+    assert client.get(
+        url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=etag
+    ).status_code == 200
+    assert client.get(
+        url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag
+    ).status_code == 304
+
+    resp = client.get('/api/v1/dictionary/concepts/?format=msgpack')
+    assert msgpack.unpackb(resp.content, raw=False) == [
+        {'id': Concept.objects.get().pk, 'title': 'Test Concept'}]
+
+
+@pytest.mark.django_db
+def test_term_list_cursor(client, userprofile, django_assert_num_queries):
+    create_terms(25, userprofile)
+    untitled = Term.objects.create(status=Term.PUBLISHED)
+    untitled.current_version = TermVersion.objects.create(term=untitled)
+    untitled.save()
+    update_documents(Term.objects.values_list('pk', flat=True))
+    Site.objects.get_current()
+    url = reverse('api:term-list')
+
+    # Page numbers still work
+    resp = client.get(url, {'page': 2})
+    assert resp.json()['count'] == 26
+    assert len(resp.json()['results']) == 6
+
+    resp = client.get(url, {'cursor': '', 'page_size': 10})
+    assert resp.json()['count'] == 26
+    titles = [x['title'] for x in resp.json()['results']]
+    while resp.json()['next']:
+        # Cursor pages skip the count once it is cached
+        with django_assert_num_queries(2):
+            resp = client.get(resp.json()['next'])
+        assert resp.json()['count'] == 26
+        titles += [x['title'] for x in resp.json()['results']]
+    assert titles == ['Term {:03}'.format(i) for i in range(25)] + [None]
+
+    resp = client.get(url, {'cursor': 'nonsense'})
+    assert resp.status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+def test_term_list_generation(client, userprofile):
+    create_terms(2, userprofile)
+    url = reverse('api:term-list')
+    resp = client.get(url)
+    assert [x['title'] for x in resp.json()['results']] == [
+        'Term 000', 'Term 001']
+
+    # Cached until the dictionary changes
+    Term.objects.filter(title='Term 001').update(title='Unseen')
+    resp = client.get(url)
+    assert [x['title'] for x in resp.json()['results']] == [
+        'Term 000', 'Term 001']
+
+    term = Term.objects.get(title='Term 000')
+    term.title = 'Renamed'
+    term.save()
+    resp = client.get(url)
+    assert [x['title'] for x in resp.json()['results']] == [
+        'Renamed', 'Unseen']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_conditional_get(client, userprofile, django_assert_num_queries):
+    create_terms(2, userprofile)
+    for url in [reverse('api:term-list'), '/api/v1/dictionary/simple/',
+                '/api/v1/dictionary/concepts/']:
+        resp = client.get(url)
+        assert resp.status_code == 200
+        etag = resp['ETag']
+        assert resp['Last-Modified']
+
+        # Validated with one aggregate, without running the view
+        with django_assert_num_queries(1):
+            resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 304
+
+    content = TermContent.objects.first()
+    detail = content.get_absolute_url()
+    etag = client.get(detail)['ETag']
+    assert client.get(detail, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    content.description = 'Changed'
+    content.save()
+    resp = client.get(detail, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp['ETag'] != etag
+
+    # Edits to rows without a modified stamp move Last-Modified too
+    url = reverse('api:term-list')
+    TermContent.objects.update(
+        modified=timezone.now() - datetime.timedelta(minutes=1))
+    cache.set(GENERATION_TIME_KEY, time.time() - 60, None)
+    last_modified = client.get(url)['Last-Modified']
+    assert client.get(
+        url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 304
+    Synonym.objects.create(
+        canonical_term=content.version.term, title='Other', slug='other')
+    assert client.get(
+        url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stale_while_revalidate(client, userprofile, monkeypatch):
+    create_terms(1, userprofile)
+    url = reverse('api:term-list')
+
+    def titles():
+        return [x['title'] for x in client.get(url).json()['results']]
+
+    etag = client.get(url)['ETag']
+    assert titles() == ['Term 000']
+    assert cache_stats(reset=True) == {
+        'hit': 1, 'miss': 1, 'stale': 0, 'bypass': 0}
+
+    term = Term.objects.get()
+    term.title = 'Renamed'
+    term.save()
+
+    # Served stale while another request holds the rebuild lock, with the
+    # validators it was rendered with
+    with monkeypatch.context() as m:
+        m.setattr(cache, 'add', lambda *args, **kwargs: False)
+        resp = client.get(url)
+        assert [x['title'] for x in resp.json()['results']] == ['Term 000']
+        assert resp['ETag'] == etag
+    resp = client.get(url)
+    assert [x['title'] for x in resp.json()['results']] == ['Renamed']
+    assert resp['ETag'] != etag
+    assert cache_stats(reset=True) == {
+        'hit': 0, 'miss': 1, 'stale': 1, 'bypass': 0}
+
+    # A cold miss renders rather than wait for whoever holds the lock
+    with monkeypatch.context() as m:
+        m.setattr(cache, 'add', lambda *args, **kwargs: False)
+        assert titles() == ['Renamed']
+        assert client.get(url + '?page=1').status_code == 200
+    assert cache_stats()['bypass'] == 1
@@ -0,0 +1,382 @@
+import gzip
+import io
+import json
+
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.sites.models import Site
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError
+from django.core.management import call_command
+from django.db.models.signals import post_delete
+from django.urls import reverse
+
+import pytest
+
+from ..importers import TranslationImporter
+from ..importers import read_json
+from ..importers import read_json_array
+from ..models import Synonym
+from ..models import Term
+from ..models import TermContent
+from ..models import TermVersion
+from ..snapshot import snapshot_content
+
+
+@pytest.fixture()
+def contents(db):
+    term = Term.objects.create(title='Linked Term', status=Term.PUBLISHED)
+    version = TermVersion.objects.create(term=term)
+    term.current_version = version
+    term.save()
+    out = []
+    for language in ['en', 'fr', 'de']:
+        out.append(TermContent.objects.create(
+            version=version,
+            title='Linked Term',
+            description='See [[Linked Term]].',
+            language=language))
+    # Simulate descriptions rendered before the lexicon knew the term
+    TermContent.objects.update(rendered_description='stale', references=[])
+    return out
+
+
+def test_rerender_descriptions(contents, tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    call_command(
+        'rerender_descriptions', language=['fr'], processes=1,
+        checkpoint=checkpoint)
+
+    rendered = dict(TermContent.objects.values_list(
+        'language', 'rendered_description'))
+    assert 'title="Linked Term"' in rendered['fr']
+    assert rendered['en'] == 'stale'
+    assert TermContent.objects.get(language='fr').references == [
+        'linked term']
+
+
+def test_rerender_descriptions_resume(contents, tmp_path):
+    checkpoint = tmp_path / 'checkpoint.json'
+    checkpoint.write_text(json.dumps({
+        'filters': {'languages': [], 'term': None, 'modified_since': None},
+        'last_pk': contents[0].pk,
+        'updated': 1,
+    }))
+    call_command(
+        'rerender_descriptions', processes=1, chunk_size=1, resume=True,
+        checkpoint=str(checkpoint))
+
+    rendered = dict(TermContent.objects.values_list(
+        'language', 'rendered_description'))
+    assert rendered['en'] == 'stale'
+    assert 'title="Linked Term"' in rendered['fr']
+    assert 'title="Linked Term"' in rendered['de']
+    assert not checkpoint.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rerender_descriptions_pool(contents, tmp_path):
+    call_command(
+        'rerender_descriptions', processes=2, chunk_size=1,
+        checkpoint=str(tmp_path / 'checkpoint.json'))
+    assert not TermContent.objects.filter(
+        rendered_description='stale').exists()
+
+
+@pytest.fixture()
+def published_term(db):
+    term = Term.objects.create(title='Model Use', status=Term.PUBLISHED)
+    version = TermVersion.objects.create(term=term)
+    term.current_version = version
+    term.save()
+    TermContent.objects.create(
+        version=version, title='Model Use', description='English',
+        language='en')
+    TermContent.objects.create(
+        version=version, title='Modell', description='Alt', language='de',
+        placeholder=True)
+    return term
+
+
+def test_import_translations_csv(published_term, tmp_path):
+    path = tmp_path / 'pack.csv'
+    path.write_text(
+        'term,language,title,description,similar\n'
+        'model-use,fr,Usage du modèle,Voir [[Model Use]].,'
+        '"Usage\nUtilisation"\n'
+        'model-use,de,Modellnutzung,Neu,\n'
+        'missing-term,fr,X,Y,\n')
+
+    call_command('import_translations', str(path), dry_run=True)
+    assert not TermContent.objects.filter(language='fr').exists()
+
+    call_command('import_translations', str(path))
+    fr = TermContent.objects.get(language='fr')
+    assert fr.title == 'Usage du modèle'
+    assert fr.is_latest
+    assert 'title="Model Use"' in fr.rendered_description
+    assert set(published_term.similar.filter(
+        language='fr').values_list('title', flat=True)) == {
+            'Usage', 'Utilisation'}
+
+    de = TermContent.objects.get(language='de')
+    assert de.title == 'Modellnutzung'
+    assert not de.placeholder
+
+
+def test_import_translations_xliff(published_term, tmp_path):
+    path = tmp_path / 'pack.xlf'
+    path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<xliff version="1.2" '
+        'xmlns="urn:oasis:names:tc:xliff:document:1.2">'
+        '<file source-language="en" target-language="es" datatype="plaintext">'
+        '<body>'
+        '<trans-unit id="model-use.1.title">'
+        '<source>Model Use</source><target>Uso del modelo</target>'
+        '</trans-unit>'
+        '<trans-unit id="model-use.1.description">'
+        '<source>English</source><target>Español</target>'
+        '</trans-unit>'
+        '</body></file></xliff>')
+
+    call_command('import_translations', str(path))
+    es = TermContent.objects.get(language='es')
+    assert es.title == 'Uso del modelo'
+    assert es.description == 'Español'
+
+
+def test_import_translations_json_lines(published_term, tmp_path):
+    path = tmp_path / 'pack.jsonl'
+    path.write_text(
+        '{"term": "model-use", "title": "Uso do modelo", '
+        '"plurals": ["Usos do modelo"]}\n'
+        '{"term": "model-use", "language": "en", "acronym": "MU"}\n')
+
+    call_command('import_translations', str(path), language='pt')
+    pt = TermContent.objects.get(language='pt')
+    assert pt.title == 'Uso do modelo'
+    assert pt.plurals.get().plural_title == 'Usos do modelo'
+    assert TermContent.objects.get(language='en').acronym == 'MU'
+
+
+def test_import_translations_invalid(published_term):
+    other = Term.objects.create(title='Other', status=Term.PUBLISHED)
+    Synonym.objects.create(
+        canonical_term=other, title='Taken', slug='taken', language='fr')
+    result = TranslationImporter().run([
+        {'term': 'model-use', 'language': 'fr', 'title': 'Usage',
+         'similar': ['Taken', 'Free']},
+        {'term': 'model-use', 'language': 'es', 'title': 'Uso',
+         'acronym': 'X' * 21},
+    ])
+
+    assert result.created == 1
+    assert sorted(line for line, message in result.errors) == [1, 2]
+    assert result.changes[-1] == ('model-use.fr', 'similar', [], ['Free'])
+    assert set(published_term.similar.values_list(
+        'title', flat=True)) == {'Free'}
+    assert not TermContent.objects.filter(language='es').exists()
+
+
+def test_import_translations_removed(published_term):
+    for title in ['Usage', 'Emploi']:
+        Synonym.objects.create(
+            canonical_term=published_term, title=title, slug=title.lower(),
+            language='fr')
+    deleted = []
+
+    def receiver(sender, **kwargs):
+        deleted.append(sender)
+
+    # Removed synonyms go in one statement, finish() updates the rest
+    post_delete.connect(receiver, sender=Synonym)
+    try:
+        TranslationImporter().run([
+            {'term': 'model-use', 'language': 'fr', 'title': 'Usage',
+             'similar': ['Usage']}])
+    finally:
+        post_delete.disconnect(receiver, sender=Synonym)
+    assert deleted == []
+    assert set(published_term.similar.values_list(
+        'title', flat=True)) == {'Usage'}
+    assert not Term.objects.filter(search_document='emploi').exists()
+
+
+def test_import_translations_malformed(published_term, tmp_path, client,
+                                       userprofile):
+    path = tmp_path / 'pack.json'
+    path.write_text('[{"term": "model-use", "language": "fr"')
+    with pytest.raises(CommandError, match='Could not read'):
+        call_command('import_translations', str(path))
+
+    userprofile.is_admin = userprofile.is_superuser = True
+    userprofile.save()
+    client.force_login(userprofile)
+    url = reverse('admin:dictionary_termcontent_import')
+    for name, content in [
+            ('pack.json', b'[{"term": "model-use",'),
+            ('pack.csv', b'\xff\xfe'),
+            ('pack.xlf', b'<xliff><file>')]:
+        resp = client.post(url, {
+            'file': SimpleUploadedFile(name, content), 'dry_run': 'on'})
+        assert resp.status_code == 200
+        assert 'Could not read' in resp.context['form'].errors['file'][0]
+    assert not TermContent.objects.filter(language='fr').exists()
+
+
+def test_read_json_array():
+    stream = io.StringIO(
+        ' [ {"term": "a", "title": "[x], {y}"},\n{"term": "b"} ] ')
+    assert [x['term'] for x in read_json(stream)] == ['a', 'b']
+
+    stream = io.StringIO('[{"term": "a"}, {"term": "b"}]')
+    stream.read(1)
+    assert len(list(read_json_array(stream, read_size=3))) == 2
+
+    with pytest.raises(ValueError):
+        list(read_json(io.StringIO('[{"term": "a"}')))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_build_snapshot(client, capsys):
+    resp = client.get(reverse('api:snapshot'))
+    assert resp.status_code == 404
+
+    # Edits only mark the snapshot, which is built periodically
+    term = Term.objects.create(title='Snapshot Term', status=Term.REVIEWED)
+    version = TermVersion.objects.create(term=term)
+    termcontent = TermContent.objects.create(
+        version=version, title='Snapshot Term', description='Described')
+    assert client.get(reverse('api:snapshot')).status_code == 404
+    call_command('build_snapshot', if_stale=True)
+    assert client.get(reverse('api:snapshot')).json()['terms'] == 0
+    call_command('build_snapshot', if_stale=True)
+    assert 'current' in capsys.readouterr().out
+    term.current_version = version
+    term.status = Term.PUBLISHED
+    term.save()
+    assert client.get(reverse('api:snapshot')).json()['terms'] == 0
+    call_command('build_snapshot', if_stale=True)
+
+    manifest = client.get(reverse('api:snapshot')).json()
+    assert manifest['terms'] == 1
+    name = 'snapshots/dictionary.{}.json'.format(manifest['hash'])
+    with default_storage.open(name) as f:
+        content = f.read()
+    with default_storage.open(name + '.gz') as f:
+        assert gzip.decompress(f.read()) == content
+    data = json.loads(content)
+    assert data['terms'][0]['content'][0]['description'] == 'Described'
+
+    # Unchanged content keeps its name
+    call_command('build_snapshot')
+    assert client.get(reverse('api:snapshot')).json()['hash'] == \
+        manifest['hash']
+
+    # Content edits are in the next snapshot, which keeps only the one
+    # it replaced
+    termcontent.description = 'Changed'
+    termcontent.save()
+    call_command('build_snapshot', if_stale=True)
+    latest = client.get(reverse('api:snapshot')).json()
+    with default_storage.open(
+            'snapshots/dictionary.{}.json'.format(latest['hash'])) as f:
+        data = json.loads(f.read())
+    assert data['terms'][0]['content'][0]['description'] == 'Changed'
+    directories, files = default_storage.listdir('snapshots')
+    assert {x.split('.')[1] for x in files if x != 'manifest.json'} == {
+        manifest['hash'], latest['hash']}
+
+    # Unpublishing marks it too
+    term.status = Term.REVIEWED
+    term.save()
+    call_command('build_snapshot', if_stale=True)
+    assert client.get(reverse('api:snapshot')).json()['terms'] == 0
+
+
+@pytest.mark.django_db
+def test_snapshot_order(client):
+    # Snapshots hold the terms of the list API in its order, so browsing
+    # can continue from an API page
+    terms = Term.objects.bulk_create([
+        Term(title=title, slug='term-{}'.format(i), status=Term.PUBLISHED)
+        for i, title in enumerate(['B', 'A', 'B', 'A'])])
+    for term in terms:
+        version = TermVersion.objects.create(term=term)
+        TermContent.objects.create(
+            version=version, title=term.title, description='')
+        Term.objects.filter(pk=term.pk).update(current_version=version)
+    Term.objects.create(title='A', status=Term.PUBLISHED)
+
+    content, count = snapshot_content()
+    listed = [
+        x['id'] for page in [1, 2]
+        for x in client.get(reverse('api:term-list'), {
+            'page': page, 'page_size': 2}).json()['results']]
+    assert [x['id'] for x in json.loads(content)['terms']] == listed
+    assert count == 4
+
+
+@pytest.mark.django_db(transaction=True)
+def test_build_static_site(capsys, monkeypatch):
+    term = Term.objects.create(title='Static Term', status=Term.PUBLISHED)
+    version = TermVersion.objects.create(term=term, draft=False)
+    term.current_version = version
+    term.save()
+    for language in ['en', 'fr']:
+        TermContent.objects.create(
+            version=version, title='Static Term', description='Described',
+            language=language)
+    draft = TermVersion.objects.create(term=term)
+    TermContent.objects.create(
+        version=draft, title='Static Term', description='Draft')
+    FlatPage.objects.create(
+        url='/about/', title='About', content='All about it'
+    ).sites.add(Site.objects.get_current())
+
+    call_command('build_static_site', processes=2, chunk_size=1)
+    assert 'Rendered 9 of 9 pages' in capsys.readouterr().out
+    with default_storage.open('site/en/static-term/1/index.html') as f:
+        assert b'Described' in f.read()
+    # The old term URLs refresh to the term page
+    for name in ['static-term', 'fr/static-term', '{}.1.en'.format(term.pk)]:
+        with default_storage.open('site/{}/index.html'.format(name)) as f:
+            page = f.read().decode('utf-8')
+        language = 'fr' if name.startswith('fr') else 'en'
+        assert 'url=/{}/static-term/1/"'.format(language) in page
+        assert 'rel="canonical"' in page
+    with default_storage.open('site/about/index.html') as f:
+        assert b'All about it' in f.read()
+    assert default_storage.exists('site/index.html')
+    assert not default_storage.exists('site/en/static-term/2/index.html')
+
+    # Only pages whose content or term changed are rendered again
+    call_command('build_static_site', processes=1)
+    assert 'Rendered 0 of 9 pages' in capsys.readouterr().out
+    content = TermContent.objects.get(language='fr', version=version)
+    content.description = 'Décrit'
+    content.save()
+    call_command('build_static_site', processes=1)
+    assert 'Rendered 2 of 9 pages' in capsys.readouterr().out
+    with default_storage.open('site/fr/static-term/1/index.html') as f:
+        assert 'Décrit' in f.read().decode('utf-8')
+
+    # A page that raises is reported and left for the next build
+    def broken(request, url):
+        raise ValueError(url)
+    monkeypatch.setattr('dictionary.static_site.flatpage', broken)
+    call_command('build_static_site', full=True, processes=1)
+    captured = capsys.readouterr()
+    assert 'Rendered 8 of 9 pages' in captured.out
+    assert 'Could not render /about/' in captured.err
+    manifest = json.loads(
+        default_storage.open('site/manifest.json').read().decode('utf-8'))
+    assert '/about/' not in manifest
+    monkeypatch.undo()
+
+    term.status = Term.REVIEWED
+    term.save()
+    call_command('build_static_site', processes=1)
+    assert 'removed 7' in capsys.readouterr().out
+    assert not default_storage.exists('site/en/static-term/1/index.html')
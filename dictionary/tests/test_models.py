@@ -1,10 +1,26 @@
+from django.contrib.sites.models import Site
 from django.core import mail
+from django.core.cache import cache
+from django.template import Context
+from django.template import Template
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db import transaction
+
+import json
 
 import pytest
 
+from ..lexicon import LEXICON_VERSION_KEY
+from ..lexicon import lexicon
+from ..models import Concept
+from ..models import PluralTitle
+from ..models import Synonym
 from ..models import Term
 from ..models import TermVersion
 from ..models import TermContent
+from ..models import render_term
+from ..rendering import RENDER_VERSION
 
 
 @pytest.mark.django_db
@@ -80,3 +96,286 @@ def test_termcontent(userprofile):
     assert content_fr in content_ar.other_languages
 
 
+@pytest.mark.django_db
+def test_render_term(django_assert_num_queries):
+    term = Term.objects.create(
+        title='Test Term',
+        status=Term.PUBLISHED)
+    version = TermVersion.objects.create(term=term)
+    term.current_version = version
+    term.save()
+    TermContent.objects.create(
+        version=version,
+        title='Le Test Term',
+        description='',
+        language='fr')
+    PluralTitle.objects.create(
+        term=term, plural_title='Test Terms', language='en')
+    Term.objects.create(title='Draft Term', status=Term.SUGGESTED)
+
+    text = '[[Test Term]], [[test terms]], [[Le Test Term]], [[Draft Term]]'
+    rendered = render_term(text)
+    assert '<a class="term" tabindex="0" title="Test Term">' in rendered
+    assert '<a class="term" tabindex="0" title="test terms">' in rendered
+    assert '<a class="term" tabindex="0" title="Le Test Term">' in rendered
+    assert rendered.endswith(', Draft Term')
+
+    # The compiled lexicon answers every link without touching the database
+    with django_assert_num_queries(0):
+        render_term(text * 30)
+
+    # Publishing a term invalidates the lexicon
+    Term.objects.filter(title='Draft Term').update(status=Term.PUBLISHED)
+    Term.objects.get(title='Draft Term').save()
+    assert 'title="Draft Term"' in render_term(text)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lexicon_invalidate_on_commit():
+    lexicon.forms()
+    version = cache.get(LEXICON_VERSION_KEY)
+    with transaction.atomic():
+        Term.objects.create(title='Uncommitted', status=Term.PUBLISHED)
+        # Other processes keep their lexicon until the term is committed
+        assert cache.get(LEXICON_VERSION_KEY) == version
+        assert 'uncommitted' in lexicon.forms()
+    assert cache.get(LEXICON_VERSION_KEY) != version
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rerender_references():
+    term = Term.objects.create(title='Test Term', status=Term.PUBLISHED)
+    version = TermVersion.objects.create(term=term)
+    term.current_version = version
+    term.save()
+
+    linking = TermContent.objects.create(
+        version=version,
+        title='Test Term',
+        description='See [[Other Term]] and [[Other Terms]].')
+    unrelated = TermContent.objects.create(
+        version=version,
+        title='Le Test Term',
+        description='Pas de liens.',
+        language='fr')
+    assert linking.references == ['other term', 'other terms']
+    assert unrelated.references == []
+    assert 'class="term"' not in linking.rendered_description
+
+    # Publishing the linked term re-renders only the rows that mention it
+    other = Term.objects.create(title='Other Term', status=Term.PUBLISHED)
+    linking.refresh_from_db()
+    unrelated_modified = unrelated.modified
+    unrelated.refresh_from_db()
+    assert 'title="Other Term"' in linking.rendered_description
+    assert 'title="Other Terms"' not in linking.rendered_description
+    assert unrelated.modified == unrelated_modified
+
+    PluralTitle.objects.create(
+        term=other, plural_title='Other Terms', language='en')
+    linking.refresh_from_db()
+    assert 'title="Other Terms"' in linking.rendered_description
+
+    # Renames are told from the values loaded, not read again before saving
+    plural = PluralTitle.objects.get(plural_title='Other Terms')
+    plural.plural_title = 'More Terms'
+    with CaptureQueriesContext(connection) as queries:
+        plural.save()
+    assert queries[0]['sql'].startswith('UPDATE')
+    linking.refresh_from_db()
+    assert 'title="Other Terms"' not in linking.rendered_description
+
+    other = Term.objects.get(pk=other.pk)
+    other.title = 'Another Term'
+    with CaptureQueriesContext(connection) as queries:
+        other.save()
+    assert queries[0]['sql'].startswith('UPDATE')
+    linking.refresh_from_db()
+    assert 'title="Other Term"' not in linking.rendered_description
+    other.title = 'Other Term'
+    other.save()
+    linking.refresh_from_db()
+    assert 'title="Other Term"' in linking.rendered_description
+
+    other.status = Term.ARCHIVED
+    other.save()
+    linking.refresh_from_db()
+    assert 'class="term"' not in linking.rendered_description
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rendered_html():
+    term = Term.objects.create(title='Wall', status=Term.PUBLISHED)
+    version = TermVersion.objects.create(term=term)
+    term.current_version = version
+    term.save()
+
+    content = TermContent.objects.create(
+        version=version,
+        title='Wall',
+        description='A **[[Wall]]**\n\n<div style="color: red">Note</div>',
+        extended_description=(
+            '<p style="text-align: center">See [[Door]]</p>'
+            '<figure><iframe src="https://www.youtube.com/embed/x" '
+            'allowfullscreen></iframe><figcaption>Video</figcaption>'
+            '</figure><video controls src="/media/wall.mp4"></video>'))
+    assert content.render_version == RENDER_VERSION
+    assert content.references == ['door', 'wall']
+
+    # Byte for byte what the page rendered with its filters before
+    template = Template(
+        '{% load markup dictionary_tags %}{% autoescape off %}'
+        '{{ content.rendered_description|markdown }}|'
+        '{{ content.extended_description|highlight_terms }}'
+        '{% endautoescape %}')
+    assert '{}|{}'.format(
+        content.description_html, content.extended_description_html
+    ) == template.render(Context({'content': content}))
+    assert '<div style="color: red">Note</div>' in content.description_html
+    assert '<iframe src="https://www.youtube.com/embed/x" allowfullscreen>' \
+        in content.extended_description_html
+
+    # Links in extended descriptions are re-rendered with the others
+    Term.objects.create(title='Door', status=Term.PUBLISHED)
+    content.refresh_from_db()
+    assert 'title="Door">Door</a>' in content.extended_description_html
+
+
+@pytest.mark.django_db(transaction=True)
+def test_termcontent_save_queries(django_assert_num_queries):
+    term = Term.objects.create(title='Test Term', status=Term.PUBLISHED)
+    version1 = TermVersion.objects.create(term=term)
+    version2 = TermVersion.objects.create(term=term)
+    term.current_version = version2
+    term.save()
+    render_term('')
+    Site.objects.get_current()
+
+    # Aggregate over the other versions, insert and update the search
+    # document. Once committed, rebuild the term's API document: the term,
+    # its versions, latest content, synonyms and concepts, then store it
+    with django_assert_num_queries(9):
+        content1 = TermContent.objects.create(
+            version=version1, title='Test Term', description='One')
+    assert content1.is_latest
+
+    # Aggregate, insert, hand over the is_latest flag, update the search
+    # document and rebuild the API document
+    with django_assert_num_queries(10):
+        content2 = TermContent.objects.create(
+            version=version2, title='Test Term', description='Two')
+    assert content2.is_latest
+    content1.refresh_from_db()
+    content2.refresh_from_db()
+    assert not content1.is_latest
+    assert content2.is_latest
+
+    # Editing is constant regardless of the number of [[links]]
+    content2 = TermContent.objects.select_related('version').get(
+        pk=content2.pk)
+    content2.description = ' '.join(['[[Test Term]]'] * 30)
+    with django_assert_num_queries(9):
+        content2.save()
+    assert content2.is_latest
+
+    content1 = TermContent.objects.select_related('version').get(
+        pk=content1.pk)
+    # Older versions do not touch the search document
+    with django_assert_num_queries(8):
+        content1.save()
+    assert not content1.is_latest
+
+    # A new title also re-renders the descriptions that link to either
+    # title, in one batch however many there are, before the document
+    content2.title = 'Renamed Term'
+    with django_assert_num_queries(12):
+        content2.save()
+
+    content2.delete()
+    content1.refresh_from_db()
+    assert content1.is_latest
+
+
+@pytest.mark.django_db
+def test_latest_content(django_assert_num_queries):
+    term = Term.objects.create(title='Test Term', status=Term.PUBLISHED)
+    for number in range(2):
+        version = TermVersion.objects.create(term=term)
+        TermContent.objects.create(
+            version=version, title='Test Term', language='en')
+    latest = term.latest_content
+    assert isinstance(latest, list)
+    assert [x.version.number for x in latest] == [2]
+
+    term = Term.objects.prefetch_related('versions__content').get()
+    with django_assert_num_queries(0):
+        assert term.latest_content == latest
+
+
+@pytest.mark.django_db
+def test_termcontent_placeholder():
+    term = Term.objects.create(title='Test Term', status=Term.PUBLISHED)
+    version = TermVersion.objects.create(term=term)
+    content = TermContent.objects.create(
+        version=version, title='Test Term', description='Copied',
+        placeholder=True)
+    assert content.placeholder
+
+    content = TermContent.objects.get(pk=content.pk)
+    content.title = 'Renamed'
+    content.save()
+    assert content.placeholder
+
+    content.description = 'Translated'
+    content.save()
+    assert not content.placeholder
+
+
+@pytest.mark.django_db
+def test_update_latest():
+    term = Term.objects.create(title='Test Term', status=Term.PUBLISHED)
+    versions = [TermVersion.objects.create(term=term) for x in range(3)]
+    for version in versions:
+        for language in ['en', 'fr']:
+            TermContent.objects.create(
+                version=version, title='Test Term', language=language)
+    TermContent.objects.filter(version=versions[2], language='fr').delete()
+    TermContent.objects.update(is_latest=False)
+
+    TermContent.objects.all().update_latest()
+    latest = set(TermContent.objects.filter(
+        is_latest=True
+    ).values_list('language', 'version__number'))
+    assert latest == {('en', 3), ('fr', 2)}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_api_document():
+    term = Term.objects.create(title='Test Term', status=Term.PUBLISHED)
+    version = TermVersion.objects.create(term=term)
+    term.current_version = version
+    term.save()
+    content = TermContent.objects.create(
+        version=version, title='Test Term', description='First')
+
+    def document():
+        return json.loads(Term.objects.get(pk=term.pk).api_document)
+
+    assert document()['content'][0]['description'] == 'First'
+
+    content.description = 'Second'
+    content.save()
+    assert document()['content'][0]['description'] == 'Second'
+
+    Synonym.objects.create(
+        title='Other Name', slug='other-name', canonical_term=term)
+    assert document()['content'][0]['similar'] == ['Other Name']
+
+    concept = Concept.objects.create(title='Concept')
+    concept.term_set.add(term)
+    assert document()['concepts'] == ['Concept']
+    concept.title = 'Renamed'
+    concept.save()
+    assert document()['concepts'] == ['Renamed']
+    concept.delete()
+    assert document()['concepts'] == []
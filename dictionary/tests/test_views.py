@@ -1,13 +1,25 @@
 from django.urls import reverse
+from django.contrib import messages
+from django.contrib.messages.storage.base import Message
+from django.contrib.messages.storage.cookie import CookieStorage
 from django.contrib.auth.models import Permission
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 import pytest
 
+from ..cache import fragment_stats
+from ..models import Concept
 from ..models import PluralTitle
 from ..models import Synonym
 from ..models import Term
 from ..models import TermContent
 from ..models import TermVersion
+from core.languages import LANGUAGES
+from core.models import TextBlock
 from core.models import UserProfile
 
 
@@ -73,6 +85,152 @@ def test_detail(client, termcontent, term):
     assert resp.context['term'] == term
 
 
+def test_detail_personal(client, termcontent, term, userprofile):
+    term.current_version = termcontent.version
+    term.save()
+    url = reverse(
+        'term-detail', args=[
+            termcontent.language, term.slug, termcontent.version.number])
+
+    resp = client.get(url)
+    assert 'Cookie' in resp['Vary']
+    etag = resp['ETag']
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    # The validators know nothing of messages or the logged in user
+    storage = CookieStorage(None)
+    client.cookies[storage.cookie_name] = storage._encode(
+        [Message(messages.INFO, 'Saved')])
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert 'Cookie' in resp['Vary']
+    del client.cookies[storage.cookie_name]
+
+    client.force_login(userprofile)
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert 'Cookie' in resp['Vary']
+
+
+@pytest.mark.django_db
+def test_detail_rendered_html(client, termcontent, term, monkeypatch):
+    term.current_version = termcontent.version
+    term.save()
+    TermContent.objects.filter(pk=termcontent.pk).update(
+        description='**Bold**', description_html='<p>Old</p>',
+        render_version=0)
+    url = reverse('term-detail', args=['en', term.slug, 1])
+    Site.objects.get_current()
+    client.get(url)
+
+    # Pages output the stored HTML, even from an older renderer, and never
+    # render or write on a GET
+    monkeypatch.setattr('dictionary.rendering.markdown.markdown', None)
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get(url)
+    assert '<p>Old</p>' in resp.content.decode()
+    assert all(x['sql'].startswith('SELECT') for x in queries)
+    monkeypatch.undo()
+
+    # Outdated content is brought up to date by the command
+    call_command('rerender_descriptions', outdated=True, processes=1)
+    termcontent.refresh_from_db()
+    assert termcontent.description_html == '<p><strong>Bold</strong></p>'
+    cache.clear()
+    resp = client.get(url)
+    assert '<p><strong>Bold</strong></p>' in resp.content.decode()
+
+
+@pytest.mark.django_db
+def test_detail_queries(client, userprofile, django_assert_num_queries):
+    languages = [code for code, name in LANGUAGES[:17]]
+    term = Term.objects.create(
+        title='Wall', slug='wall', status=Term.PUBLISHED)
+    versions = [
+        TermVersion.objects.create(term=term, draft=False)
+        for i in range(10)]
+    term.current_version = versions[-1]
+    term.save()
+    for version in versions:
+        for language in languages:
+            TermContent.objects.create(
+                version=version, title='Wall', description='A wall',
+                language=language, author=userprofile)
+    Synonym.objects.create(
+        canonical_term=term, title='Partition', slug='partition')
+    term.concepts.add(Concept.objects.create(title='Elements'))
+    TextBlock.objects.create(slug='info-channel-dictionary-detail')
+    Site.objects.get_current()
+    url = reverse('term-detail', args=['en', 'wall', 5])
+
+    # The page's validators, then the content with its version, term and
+    # author, versions, other languages, similar terms, concepts and the
+    # info channel text block, whatever the number of languages and
+    # versions
+    with django_assert_num_queries(7):
+        resp = client.get(url)
+    assert resp.status_code == 200
+    assert len(resp.context['other_languages']) == 17
+    assert len(resp.context['other_versions']) == 9
+    assert [str(x) for x in resp.context['similar']] == ['Partition']
+    assert [str(x) for x in resp.context['concepts']] == ['Elements']
+    content = resp.content.decode()
+    # The other nine versions, the current version and the English link
+    assert content.count('href="/en/wall/') == 11
+    assert 'href="/en/wall/5/"' not in content
+    assert content.count('href="/fr/wall/10/"') == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_detail_fragments(client, django_assert_num_queries, monkeypatch):
+    monkeypatch.setattr('dictionary.cache.FRAGMENT_SAMPLE_RATE', 1)
+    term = Term.objects.create(
+        title='Wall', slug='wall', status=Term.PUBLISHED)
+    version = TermVersion.objects.create(term=term, draft=False)
+    term.current_version = version
+    term.save()
+    for language in ['en', 'fr']:
+        TermContent.objects.create(
+            version=version, title='Wall', description='A wall',
+            language=language)
+    TextBlock.objects.create(slug='info-channel-dictionary-detail')
+    Site.objects.get_current()
+    url = reverse('term-detail', args=['en', 'wall', 1])
+
+    client.get(url)
+    assert fragment_stats(reset=True)['term-card'] == {'hit': 0, 'miss': 1}
+
+    # Only validators, the content and the text block once cached
+    with django_assert_num_queries(3):
+        resp = client.get(url)
+    assert 'href="/fr/wall/1/"' in resp.content.decode()
+    assert all(x == {'hit': 1, 'miss': 0}
+               for x in fragment_stats(reset=True).values())
+
+    # Other languages share the term's language and version fragments
+    client.get(reverse('term-detail', args=['fr', 'wall', 1]))
+    stats = fragment_stats(reset=True)
+    assert stats['term-card'] == stats['term-related'] == {
+        'hit': 0, 'miss': 1}
+    assert stats['term-languages'] == stats['term-versions'] == {
+        'hit': 1, 'miss': 0}
+
+    # Editing anything shown on the page renders its fragments again
+    Synonym.objects.create(
+        canonical_term=term, title='Partition', slug='partition')
+    resp = client.get(url)
+    assert 'Partition' in resp.content.decode()
+    assert fragment_stats(reset=True)['term-related'] == {
+        'hit': 0, 'miss': 1}
+
+    # Requests outside the sample count nothing
+    monkeypatch.setattr('dictionary.cache.FRAGMENT_SAMPLE_RATE', 0)
+    client.get(url)
+    assert all(x == {'hit': 0, 'miss': 0}
+               for x in fragment_stats().values())
+
+
 @pytest.mark.django_db
 def test_redirects(client, termcontent, term):
     term.current_version = termcontent.version
@@ -355,3 +513,25 @@ def test_termcontent_create(
     assert resp['Location'] == dest_url
 
 
+@pytest.mark.django_db
+def test_term_autocomplete(client):
+    model = Term.objects.create(title='Information Model')
+    delivery = Term.objects.create(title='Information Delivery')
+    Term.objects.create(title='Level_of_Detail')
+    Synonym.objects.create(
+        title='Building Model', slug='building-model', canonical_term=model)
+    PluralTitle.objects.create(term=delivery, plural_title='Deliveries')
+
+    def search(q):
+        resp = client.get(reverse('term-autocomplete'), {'q': q})
+        return [x['text'] for x in resp.json()['results']]
+
+    assert sorted(search('informat')) == [
+        'Information Delivery', 'Information Model']
+    # Typos, synonyms and plurals
+    assert search('Informaton Model')[0] == 'Information Model'
+    assert search('building') == ['Information Model']
+    assert search('deliveries') == ['Information Delivery']
+    # LIKE wildcards in the query are literal
+    assert search('Level_') == ['Level_of_Detail']
+    assert search('%') == []
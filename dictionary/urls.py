@@ -1,10 +1,11 @@
 from django.conf.urls import url
 from django.urls import path
-from django.views.decorators.cache import cache_page
 from django.views.generic import TemplateView
 
 
 from dictionary import views
+from dictionary.cache import conditional
+from dictionary.cache import generation_cache_page
 
 
 urlpatterns = [
@@ -28,12 +29,14 @@ urlpatterns = [
     url(r'^manage/$', views.ManageView.as_view(), name='manage'),
 
     url(r'^$',
-        cache_page(360)(views.DictionaryIndexView.as_view(
+        generation_cache_page()(views.DictionaryIndexView.as_view(
             template_name='dictionary/index.html')),
         name='index'),
     url(r'^(?P<language>[a-z]{2})/(?P<slug>[-a-zA-Z0-9]+)/(?P<version>\d+)/$',
-        cache_page(360)(views.TermDetailView.as_view(
-            template_name='dictionary/term_detail.html')),
+        # Parts of the page are cached as template fragments instead
+        conditional(views.term_detail_modified, personal=True)(
+            views.TermDetailView.as_view(
+                template_name='dictionary/term_detail.html')),
         name='term-detail'),
 
     url(r'^(?P<language>[a-z]{2})/(?P<slug>[-a-zA-Z0-9]+)/$',
@@ -0,0 +1,17 @@
+def chunked_queryset(queryset, chunk_size=500, start_after=None):
+    """
+    Yield lists of at most chunk_size objects from queryset in primary key
+    order. Each chunk is a separate keyset query, so memory stays flat and
+    prefetch_related still applies to every chunk.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = start_after
+    while True:
+        chunk_qs = queryset
+        if last_pk is not None:
+            chunk_qs = chunk_qs.filter(pk__gt=last_pk)
+        chunk = list(chunk_qs[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
@@ -1,5 +1,3 @@
-import json
-
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.mixins import PermissionRequiredMixin
@@ -17,16 +15,18 @@ from django.views.generic.edit import CreateView
 from django.views.generic.edit import UpdateView
 from django.views.decorators.clickjacking import xframe_options_exempt
 
-from django_countries import countries
 from dal import autocomplete
 
 from core.languages import LANGUAGES
 from . import forms
 from . import models
+from .cache import flush_fragment_stats
+from .lookups import CONTAINS
+from .lookups import search_terms
+from .pages import term_page
 
 
 all_languages = dict(LANGUAGES)
-all_countries = dict(countries)
 
 
 class TermAutocomplete(autocomplete.Select2QuerySetView):
@@ -34,7 +34,7 @@ class TermAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
         qs = models.Term.objects.all()
         if self.q:
-            qs = qs.filter(title__istartswith=self.q)
+            qs = search_terms(qs, self.q)
 
         return qs
 
@@ -44,7 +44,7 @@ class TermVersionAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
         qs = models.TermVersion.objects.all()
         if self.q:
-            qs = qs.filter(term__title__istartswith=self.q)
+            qs = search_terms(qs, self.q, term='term__')
 
         return qs
 
@@ -58,26 +58,15 @@ def embed_view(request):
 
 
 class DictionaryIndexView(TemplateView):
+    """The filters are loaded from the facets API"""
     template_name = 'dictionary/index.html'
 
-    def get_context_data(self, *args, **kwargs):
-        context = super().get_context_data(*args, **kwargs)
-        used_countries = set(x.upper() for x in
-            models.Term.objects.values_list('country', flat=True) if x)
-        country_codes = []
-        for country in used_countries:
-            country_codes.append(
-                {'code': country, 'name': all_countries.get(country)})
-        context['country_codes'] = json.dumps(country_codes)
-        languages = []
-        used_languages = sorted(list(set(
-            models.TermContent.objects.values_list('language', flat=True))))
-        for language in used_languages:
-            languages.append({
-                'code': language,
-                'name': str(all_languages.get(language))})
-        context['languages'] = json.dumps(languages)
-        return context
+
+def term_detail_modified(request, language, slug, version):
+    # Stamped whenever the term or anything on its page changes
+    return models.Term.objects.filter(
+        slug=slug.lower()
+    ).values_list('modified', flat=True).first()
 
 
 class TermDetailView(DetailView):
@@ -85,21 +74,22 @@ class TermDetailView(DetailView):
     template_name = 'dictionary/term_detail.html'
 
     def get_object(self, queryset=None, *args, **kwargs):
-        term_content = get_object_or_404(
-            models.TermContent,
-            version__number=self.kwargs['version'],
-            version__term__slug=self.kwargs['slug'].lower(),
-            language=self.kwargs['language']
-        )
-        return term_content
+        self.page = term_page(
+            self.kwargs['language'], self.kwargs['slug'],
+            self.kwargs['version'])
+        return self.page['termcontent']
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
-        termcontent = self.get_object()
-        context['version'] = termcontent.version
-        context['term'] = termcontent.version.term
+        context.update(self.page)
         return context
 
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        response.add_post_render_callback(
+            lambda response: flush_fragment_stats(self.request))
+        return response
+
 
 class TermDetailRedirectView(RedirectView):
     permanent = True
@@ -339,7 +329,7 @@ class ManageView(PermissionRequiredMixin, ListView):
         q = self.request.GET.get('q')
 
         if q:
-            qs = qs.filter(title__icontains=q)
+            qs = search_terms(qs, q, CONTAINS)
 
         return qs
 